@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 import os
+import tempfile
+from datetime import timedelta
 import environ
 from pathlib import Path
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,11 +40,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     #thirdpart
     "rest_framework",
     "drf_spectacular",
-    "rest_framework.authtoken",
 
     #local
     'core',
@@ -62,6 +64,9 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'app.urls'
 
+# Applies the test-only settings, see app.test_runner
+TEST_RUNNER = 'app.test_runner.TestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -94,6 +99,73 @@ DATABASES = {
         'PORT': env('DB_PORT', default='5432'),
     }
 }
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Local-memory LRU by default; point REDIS_URL at a Redis instance to share
+# the cache between processes in production.
+
+if env('REDIS_URL', default=None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': env('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': env.int('CACHE_MAX_ENTRIES', default=1000)},
+        }
+    }
+
+# Recipe list cache (core.cache). With the per-process LocMemCache a write
+# handled by one worker only reaches other workers' cached lists and list
+# ETags after RECIPE_CACHE_TIMEOUT; set REDIS_URL, or set
+# RECIPE_CACHE_ALIAS to an empty value to turn list caching off.
+RECIPE_CACHE_ALIAS = env('RECIPE_CACHE_ALIAS', default='default') or None
+RECIPE_CACHE_TIMEOUT = env.int('RECIPE_CACHE_TIMEOUT', default=300)
+
+# API tokens (core.models.AuthToken) expire after this long unused; each
+# use past half of it pushes the expiry forward again.
+AUTH_TOKEN_LIFETIME = timedelta(days=env.int('AUTH_TOKEN_LIFETIME_DAYS', default=30))
+
+# Activation and password reset tokens (core.models.EmailToken)
+EMAIL_TOKEN_LIFETIME = timedelta(minutes=env.int('EMAIL_TOKEN_LIFETIME_MINUTES', default=4))
+
+# Cache holding the auth endpoint throttle counters; must be shared
+# (Redis) when running more than one process.
+THROTTLE_CACHE_ALIAS = 'default'
+
+# user.backends.EmailBackend remembers emails with no account this long.
+# In a per-process cache a just-registered email can stay "missing" in
+# other workers until the timeout; an empty alias turns it off.
+AUTH_MISSING_EMAIL_CACHE_ALIAS = env('AUTH_MISSING_EMAIL_CACHE_ALIAS', default='default') or None
+AUTH_MISSING_EMAIL_CACHE_TIMEOUT = env.int('AUTH_MISSING_EMAIL_CACHE_TIMEOUT', default=300)
+
+# Token lookups cached per process (and optionally in a shared cache alias)
+# by user.authentication.CachedTokenAuthentication.
+TOKEN_AUTH_CACHE_SIZE = env.int('TOKEN_AUTH_CACHE_SIZE', default=10000)
+TOKEN_AUTH_CACHE_TIMEOUT = env.int('TOKEN_AUTH_CACHE_TIMEOUT', default=60)
+TOKEN_AUTH_SHARED_CACHE = env('TOKEN_AUTH_SHARED_CACHE', default=None)
+
+# Resized copies of recipe images (recipe.images): WEBP or AVIF, falling
+# back to WebP if Pillow was built without AVIF support.
+RECIPE_IMAGE_VARIANT_FORMAT = env('RECIPE_IMAGE_VARIANT_FORMAT', default='WEBP')
+RECIPE_IMAGE_VARIANT_QUALITY = env.int('RECIPE_IMAGE_VARIANT_QUALITY', default=80)
+
+# Chunked image uploads (recipe.uploads) are assembled in this directory,
+# rejected past the size limit and abandoned after the lifetime.
+RECIPE_IMAGE_UPLOAD_DIR = env(
+    'RECIPE_IMAGE_UPLOAD_DIR', default=os.path.join(tempfile.gettempdir(), 'recipe-uploads'),
+)
+RECIPE_IMAGE_UPLOAD_MAX_SIZE = env.int('RECIPE_IMAGE_UPLOAD_MAX_SIZE', default=20 * 1024 * 1024)
+RECIPE_IMAGE_UPLOAD_LIFETIME = timedelta(hours=env.int('RECIPE_IMAGE_UPLOAD_LIFETIME_HOURS', default=24))
+
+# Deletions older than this are purged by `manage.py purge_tombstones`;
+# clients syncing from before then get a full resync.
+RECIPE_SYNC_TOMBSTONE_DAYS = env.int('RECIPE_SYNC_TOMBSTONE_DAYS', default=90)
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -112,6 +184,33 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing
+# PASSWORD_HASHER_PROFILE picks the hasher for new passwords; the others
+# stay listed so existing hashes still verify, and are rehashed with the
+# chosen one (and its current cost) on the next successful login.
+# Compare profiles with `manage.py benchmark_hashers`.
+
+PASSWORD_HASHER_PROFILES = {
+    # Needs the argon2-cffi package
+    'argon2': 'user.hashers.TunedArgon2PasswordHasher',
+    'scrypt': 'user.hashers.TunedScryptPasswordHasher',
+    'pbkdf2': 'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    # Deliberately weak, for test runs only (app.test_runner)
+    'fast': 'django.contrib.auth.hashers.MD5PasswordHasher',
+}
+PASSWORD_HASHER_PROFILE = env('PASSWORD_HASHER_PROFILE', default='scrypt')
+PASSWORD_HASHERS = [PASSWORD_HASHER_PROFILES[PASSWORD_HASHER_PROFILE]] + [
+    hasher for profile, hasher in PASSWORD_HASHER_PROFILES.items()
+    if profile not in (PASSWORD_HASHER_PROFILE, 'fast')
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+SCRYPT_WORK_FACTOR = env.int('SCRYPT_WORK_FACTOR', default=2 ** 14)
+SCRYPT_BLOCK_SIZE = env.int('SCRYPT_BLOCK_SIZE', default=8)
+SCRYPT_PARALLELISM = env.int('SCRYPT_PARALLELISM', default=1)
+ARGON2_TIME_COST = env.int('ARGON2_TIME_COST', default=2)
+ARGON2_MEMORY_COST = env.int('ARGON2_MEMORY_COST', default=102400)
+ARGON2_PARALLELISM = env.int('ARGON2_PARALLELISM', default=8)
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -136,6 +235,31 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# collectstatic writes content-hashed names plus gzip/brotli copies
+# (core.storage); app.test_runner swaps in plain names, as tests don't
+# run collectstatic.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': env(
+            'STATICFILES_BACKEND', default='core.storage.CompressedManifestStaticFilesStorage',
+        ),
+    },
+}
+
+# Static and media requests that reach Django (core.serving) are handed to
+# the web server: 'nginx' with X-Accel-Redirect to internal locations
+# SENDFILE_NGINX_PREFIX + 'static/' and + 'media/' (aliases of STATIC_ROOT
+# and MEDIA_ROOT), 'xsendfile' with X-Sendfile. Unset, Python streams them.
+SENDFILE_BACKEND = env('SENDFILE_BACKEND', default=None)
+SENDFILE_NGINX_PREFIX = env('SENDFILE_NGINX_PREFIX', default='/internal/')
+# Cache lifetimes for names that may be reused; hashed static files and
+# content-addressed images are cached for a year as immutable.
+STATIC_MAX_AGE = env.int('STATIC_MAX_AGE', default=300)
+MEDIA_MAX_AGE = env.int('MEDIA_MAX_AGE', default=3600)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -153,10 +277,24 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS':'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'recipe.pagination.IdCursorPagination',
+    'PAGE_SIZE': env.int('API_PAGE_SIZE', default=25),
+    # Used by user.throttling, keyed '<view throttle_scope>.<ip|email>'
+    'DEFAULT_THROTTLE_RATES': {
+        'login.ip': '30/min',
+        'login.email': '5/min',
+        'password_reset.ip': '10/hour',
+        'password_reset.email': '3/hour',
+        'email_token.ip': '20/hour',
+    },
+    # Reverse proxies in front of the app. Per-IP throttles only trust
+    # that many X-Forwarded-For entries; with 0 they key on REMOTE_ADDR.
+    'NUM_PROXIES': env.int('NUM_PROXIES', default=0),
 }
+# EmailBackend extends ModelBackend (permissions included); listing both
+# would look up and hash every failed login twice.
 AUTHENTICATION_BACKENDS = [
     'user.backends.EmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 SPECTACULAR_SETTINGS = {
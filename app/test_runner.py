@@ -0,0 +1,36 @@
+"""
+Test runner for `manage.py test`, applying settings meant only for test
+runs on top of app.settings.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def test_settings():
+    return {
+        # Nearly every test creates users; a real hasher would dominate the run
+        'PASSWORD_HASHER_PROFILE': 'fast',
+        'PASSWORD_HASHERS': [
+            settings.PASSWORD_HASHER_PROFILES['fast'], *settings.PASSWORD_HASHERS,
+        ],
+        # The manifest only exists after collectstatic
+        'STORAGES': {
+            **settings.STORAGES,
+            'staticfiles': {
+                'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+            },
+        },
+    }
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._test_settings = override_settings(**test_settings())
+        self._test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._test_settings.disable()
+        super().teardown_test_environment(**kwargs)
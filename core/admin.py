@@ -6,7 +6,7 @@ from django.utils.translation import gettext_lazy as _
 
 class UserAdmin(BaseUserAdmin):
     ordering = ["id"]
-    list_display = ["email", "name", "is_active", "is_superuser", "email_token", "token_created_at",]
+    list_display = ["email", "name", "is_active", "is_superuser",]
     fieldsets = (
         (None, 
             {
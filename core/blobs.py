@@ -0,0 +1,96 @@
+"""
+Content-addressed storage for uploaded images.
+
+Each distinct file is stored once, under a name derived from its SHA-256
+(core.models.image_blob_path), and reference counted by an ImageBlob
+row. When the last reference goes, the file and the variants rendered
+from it are deleted after commit, unless the blob was taken again by then.
+"""
+import hashlib
+
+from django.db import transaction
+from django.db.models import F
+
+from core.models import ImageBlob, Recipe, image_blob_path
+
+
+def get_storage():
+    return Recipe._meta.get_field('image').storage
+
+
+def hash_file(uploaded_file):
+    """SHA-256 of the file, read chunk by chunk so it never sits in memory."""
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+@transaction.atomic
+def acquire_blob(uploaded_file):
+    """
+    Store the file unless the same bytes already are, and take a reference
+    to it. Returns the stored name.
+    """
+    digest = hash_file(uploaded_file)
+    blob = ImageBlob.objects.select_for_update().filter(digest=digest).first()
+    storage = get_storage()
+    if blob is None:
+        name = image_blob_path(digest, uploaded_file.name)
+        _write(storage, name, uploaded_file)
+        blob, _ = ImageBlob.objects.get_or_create(
+            digest=digest, defaults={'name': name, 'size': uploaded_file.size},
+        )
+    elif blob.ref_count == 0 and not storage.exists(blob.name):
+        # Left behind by a collection whose commit failed after the
+        # files were deleted
+        _write(storage, blob.name, uploaded_file)
+        blob.variants = {}
+        blob.save(update_fields=['variants'])
+    ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+    return blob.name
+
+
+def _write(storage, name, uploaded_file):
+    if not storage.exists(name):
+        saved = storage.save(name, uploaded_file)
+        if saved != name:
+            # Another upload of the same bytes wrote it first
+            storage.delete(saved)
+
+
+@transaction.atomic
+def release_blob(name, extra_names=()):
+    """
+    Drop one reference to a stored image, deleting its files once unused.
+    Names from before content addressing have no blob and a single owner,
+    so they are deleted right away, along with extra_names (variants).
+    """
+    if not name:
+        return
+    blob = ImageBlob.objects.select_for_update().filter(name=name).first()
+    if blob is None:
+        names = [name, *extra_names]
+        transaction.on_commit(lambda: _delete(names))
+        return
+    ImageBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') - 1)
+    if blob.ref_count == 1:
+        transaction.on_commit(lambda: _collect(blob.pk))
+
+
+def _delete(names):
+    storage = get_storage()
+    for name in names:
+        storage.delete(name)
+
+
+@transaction.atomic
+def _collect(pk):
+    # Under the row lock, so acquire_blob either takes a reference first
+    # (and the files stay) or finds no blob afterwards and writes them again
+    blob = ImageBlob.objects.select_for_update().filter(pk=pk, ref_count=0).first()
+    if blob is None:
+        return
+    blob.delete()
+    _delete([blob.name, *blob.variants.values()])
@@ -0,0 +1,62 @@
+"""
+Per-user generation counters for cached responses.
+
+Every write to a user's recipes, tags or ingredients bumps their
+generation; cache keys include it, so old entries are never read again
+and simply age out of the cache.
+
+With RECIPE_CACHE_ALIAS set to None (no shared cache) nothing is cached
+and there is nothing to invalidate.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+def is_enabled():
+    return settings.RECIPE_CACHE_ALIAS is not None
+
+
+def get_cache():
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def _generation_key(user_id):
+    return f'recipe:generation:{user_id}'
+
+
+def _seed():
+    # Clock based rather than 1, so a counter evicted from the cache can
+    # never restart at a value that older entries were stored under.
+    return time.time_ns()
+
+
+def get_generation(user_id):
+    cache = get_cache()
+    generation = cache.get(_generation_key(user_id))
+    if generation is None:
+        cache.add(_generation_key(user_id), _seed(), timeout=None)
+        generation = cache.get(_generation_key(user_id))
+    return generation
+
+
+def _bump(user_id):
+    cache = get_cache()
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        cache.set(_generation_key(user_id), _seed(), timeout=None)
+
+
+def bump_generation(user_id):
+    """
+    Invalidate everything cached for the user. Bumps now and again once
+    the transaction commits, so a reader that cached pre-commit data in
+    between doesn't keep serving it.
+    """
+    if not is_enabled():
+        return
+    _bump(user_id)
+    transaction.on_commit(lambda: _bump(user_id))
@@ -0,0 +1,75 @@
+"""
+Delivery of queued OutgoingEmail rows.
+
+Workers claim due rows with SELECT ... FOR UPDATE SKIP LOCKED, so any
+number of them can run side by side, and send a whole batch over one
+connection from get_connection().
+"""
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import OutgoingEmail
+
+MAX_RETRY_DELAY = timedelta(hours=6)
+
+
+def retry_delay(attempts, base_delay):
+    """Exponential backoff: base_delay, 2 * base_delay, 4 * ... capped."""
+    return min(timedelta(seconds=base_delay * 2 ** (attempts - 1)), MAX_RETRY_DELAY)
+
+
+def _failed(email, error, now, max_attempts, base_delay):
+    email.attempts += 1
+    email.last_error = f'{type(error).__name__}: {error}'
+    if email.attempts >= max_attempts:
+        email.status = OutgoingEmail.STATUS_FAILED
+    else:
+        email.next_attempt_at = now + retry_delay(email.attempts, base_delay)
+
+
+@transaction.atomic
+def send_queued_emails(batch_size=100, max_attempts=5, base_delay=60):
+    """
+    Send up to batch_size due messages; returns (sent, failed) counts for
+    the batch. Failures are retried with backoff until max_attempts.
+    """
+    now = timezone.now()
+    batch = list(
+        OutgoingEmail.objects.select_for_update(skip_locked=True).filter(
+            status=OutgoingEmail.STATUS_QUEUED, next_attempt_at__lte=now,
+        ).order_by('next_attempt_at')[:batch_size]
+    )
+    if not batch:
+        return 0, 0
+
+    sent = 0
+    tried = set()
+    try:
+        with get_connection() as connection:
+            for email in batch:
+                tried.add(email.pk)
+                try:
+                    EmailMessage(
+                        email.subject, email.body, email.from_email, email.to,
+                        connection=connection,
+                    ).send()
+                except Exception as exc:
+                    _failed(email, exc, now, max_attempts, base_delay)
+                else:
+                    email.status = OutgoingEmail.STATUS_SENT
+                    email.attempts += 1
+                    email.sent_at = timezone.now()
+                    sent += 1
+    except Exception as exc:
+        # Opening the connection failed: nothing left in the batch was tried
+        for email in batch:
+            if email.pk not in tried:
+                _failed(email, exc, now, max_attempts, base_delay)
+
+    OutgoingEmail.objects.bulk_update(batch, [
+        'status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at',
+    ])
+    return sent, len(batch) - sent
@@ -0,0 +1,33 @@
+"""
+Django command to delete expired API and email tokens
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import AuthToken, EmailToken
+
+
+class Command(BaseCommand):
+    """Delete expired tokens in batches to keep each DELETE short."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def purge(self, model, batch_size):
+        expired = model.objects.filter(expires_at__lte=timezone.now())
+        total = 0
+        while True:
+            batch = list(expired.values_list('id', flat=True)[:batch_size])
+            if not batch:
+                break
+            total += model.objects.filter(id__in=batch).delete()[0]
+        return total
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        api_tokens = self.purge(AuthToken, options['batch_size'])
+        email_tokens = self.purge(EmailToken, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {api_tokens} tokens and {email_tokens} email tokens'
+        ))
@@ -0,0 +1,30 @@
+"""
+Django command to delete tombstones older than the sync retention
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Tombstone
+
+
+class Command(BaseCommand):
+    """Delete expired tombstones in batches to keep each DELETE short."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        cutoff = timezone.now() - timedelta(days=settings.RECIPE_SYNC_TOMBSTONE_DAYS)
+        expired = Tombstone.objects.filter(deleted_at__lt=cutoff)
+        total = 0
+        while True:
+            batch = list(expired.values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            total += Tombstone.objects.filter(id__in=batch).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {total} tombstones'))
@@ -0,0 +1,50 @@
+"""
+Django command to deliver queued emails
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.mail import send_queued_emails
+
+
+class Command(BaseCommand):
+    """Send the email outbox in batches, polling until stopped."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument(
+            '--retry-delay', type=int, default=60,
+            help='Seconds before the first retry; doubles on each attempt.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=2,
+            help='Seconds to sleep when the outbox is empty.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once no due messages are left.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = send_queued_emails(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'],
+                base_delay=options['retry_delay'],
+            )
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Sent {sent}, failed {failed}')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {total_sent} emails ({total_failed} failed attempts)'
+        ))
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.7 on 2026-10-18 01:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    The auto-created M2M tables only index (recipe_id, attr_id) via their
+    unique constraint; filtering recipes by tag/ingredient needs the
+    reverse order to be an index-only scan.
+    """
+
+    dependencies = [
+        ('core', '0009_user_token_expiration'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_tags_tag_recipe_idx '
+            'ON core_recipe_tags (tag_id, recipe_id);',
+            reverse_sql='DROP INDEX core_recipe_tags_tag_recipe_idx;',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX core_recipe_ingredients_ing_recipe_idx '
+            'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+            reverse_sql='DROP INDEX core_recipe_ingredients_ing_recipe_idx;',
+        ),
+    ]
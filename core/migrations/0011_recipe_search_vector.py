@@ -0,0 +1,42 @@
+# Generated by Django 5.0.7 on 2026-10-18 01:31
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Same weights as RecipeQuerySet.touch(), for existing rows.
+BACKFILL_SQL = """
+UPDATE core_recipe r SET search_vector =
+    setweight(to_tsvector('english', coalesce(r.title, '')), 'A')
+    || setweight(to_tsvector('english',
+        coalesce((SELECT string_agg(t.name, ' ')
+                  FROM core_recipe_tags rt JOIN core_tag t ON t.id = rt.tag_id
+                  WHERE rt.recipe_id = r.id), '')
+        || ' ' ||
+        coalesce((SELECT string_agg(i.name, ' ')
+                  FROM core_recipe_ingredients ri
+                  JOIN core_ingredient i ON i.id = ri.ingredient_id
+                  WHERE ri.recipe_id = r.id), '')
+    ), 'B')
+    || setweight(to_tsvector('english', coalesce(r.description, '')), 'C');
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipe_attr_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search__c01407_gin'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
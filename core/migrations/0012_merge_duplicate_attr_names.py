@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-18 01:32
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Fold same-named tags/ingredients of a user into the oldest one."""
+    Recipe = apps.get_model('core', 'Recipe')
+    for model_name, field in (('Tag', 'tags'), ('Ingredient', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipe, field).through
+        target = f'{model_name.lower()}_id'
+        duplicates = model.objects.values('user_id', 'name').annotate(
+            keep=Min('id'), total=Count('id'),
+        ).filter(total__gt=1)
+        for dup in duplicates:
+            group = model.objects.filter(user_id=dup['user_id'], name=dup['name'])
+            recipe_ids = set(through.objects.filter(
+                **{f'{target}__in': group.values('id')},
+            ).values_list('recipe_id', flat=True))
+            others = group.exclude(id=dup['keep'])
+            through.objects.filter(**{f'{target}__in': others.values('id')}).delete()
+            through.objects.bulk_create(
+                [through(recipe_id=rid, **{target: dup['keep']}) for rid in recipe_ids],
+                ignore_conflicts=True,
+            )
+            others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names, migrations.RunPython.noop),
+    ]
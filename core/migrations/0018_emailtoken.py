@@ -0,0 +1,41 @@
+# Generated by Django 5.0.7 on 2026-10-18 01:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_outgoingemail'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='user',
+            name='email_token',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='token_created_at',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='token_expiration',
+        ),
+        migrations.CreateModel(
+            name='EmailToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(choices=[('activation', 'Activation'), ('reset', 'Password reset')], max_length=20)),
+                ('key_hash', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='email_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'purpose'], name='core_emailt_user_id_3871c0_idx')],
+            },
+        ),
+    ]
@@ -1,13 +1,18 @@
 """
 Database models
 """
+import hashlib
 import os
 import uuid
 import secrets
-from datetime import timedelta
 from app import settings
 from django.utils import timezone
 from django.db import models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 
 def recipe_image_file_path(instance, filename):
@@ -15,6 +20,11 @@ def recipe_image_file_path(instance, filename):
     filename = f'{uuid.uuid4()}{ext}'
     return os.path.join('uploads', 'recipe', filename)
 
+def image_blob_path(digest, filename):
+    """Content-addressed name, fanned out over 256 directories"""
+    ext = os.path.splitext(filename)[1].lower()
+    return os.path.join('uploads', 'recipe', digest[:2], f'{digest}{ext}')
+
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **kwargs):
         if not email:
@@ -41,30 +51,211 @@ class User(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=False)
     is_staff = models.BooleanField(default=False)
 
-    email_token = models.CharField(max_length=64, blank=True, null=True)
-    token_created_at = models.DateTimeField(blank=True, null=True)
-    token_expiration = models.DateTimeField(blank=True, null=True)
-
     objects = UserManager()
     USERNAME_FIELD = 'email'
 
-    def set_email_token(self):
-        """Generates a new reset token and sets its expiration time."""
-        self.email_token = secrets.token_hex(4)
-        self.token_expiration = timezone.now() + timedelta(minutes=4)
-        self.save()
+def hash_token_key(key):
+    """SHA-256 of a random token; a slow password hash would add nothing."""
+    return hashlib.sha256(key.encode()).hexdigest()
+
+class AuthTokenManager(models.Manager):
+
+    def create_token(self, user, name=''):
+        """
+        Issue a token for one of the user's devices. Returns (token, key);
+        the key is only known here, the database keeps its hash.
+        """
+        prefix = secrets.token_hex(AuthToken.PREFIX_BYTES)
+        key = f'{prefix}.{secrets.token_urlsafe(32)}'
+        token = self.create(
+            user=user,
+            name=name,
+            prefix=prefix,
+            key_hash=AuthToken.hash_key(key),
+            expires_at=timezone.now() + settings.AUTH_TOKEN_LIFETIME,
+        )
+        return token, key
+
+class AuthToken(models.Model):
+    """
+    API token sent as "Token <prefix>.<secret>". Looked up by its unique
+    prefix and checked against a SHA-256 of the whole key; the secret is
+    random, see hash_token_key.
+    """
+    PREFIX_BYTES = 6
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='auth_tokens',
+    )
+    name = models.CharField(max_length=100, blank=True)
+    prefix = models.CharField(max_length=2 * PREFIX_BYTES, unique=True)
+    key_hash = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Only written when the expiry slides, so at most once per half lifetime
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = AuthTokenManager()
+
+    hash_key = staticmethod(hash_token_key)
+
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def refresh(self):
+        """
+        Push the expiry a full lifetime ahead once less than half of it is
+        left. Returns whether it did.
+        """
+        now = timezone.now()
+        lifetime = settings.AUTH_TOKEN_LIFETIME
+        if self.expires_at - now > lifetime / 2:
+            return False
+        self.expires_at = now + lifetime
+        self.last_used_at = now
+        AuthToken.objects.filter(pk=self.pk).update(
+            expires_at=self.expires_at, last_used_at=now,
+        )
+        return True
+
+    def __str__(self) -> str:
+        return f'{self.user} {self.name or self.prefix}'
+
+class EmailTokenManager(models.Manager):
+
+    def create_token(self, user, purpose):
+        """
+        Issue a single-use token for the user, replacing any earlier one
+        with the same purpose. Returns (token, key); only the hash is kept.
+        """
+        self.filter(user=user, purpose=purpose).delete()
+        key = secrets.token_urlsafe(24)
+        token = self.create(
+            user=user,
+            purpose=purpose,
+            key_hash=hash_token_key(key),
+            expires_at=timezone.now() + settings.EMAIL_TOKEN_LIFETIME,
+        )
+        return token, key
+
+    def consume(self, key, purpose):
+        """
+        Return the user the key was issued to and delete the token, or
+        None if it is unknown, expired or already used.
+        """
+        token = self.select_related('user').filter(
+            key_hash=hash_token_key(key), purpose=purpose, expires_at__gt=timezone.now(),
+        ).first()
+        # Only the request whose DELETE removes the row gets to use it
+        if token is None or not self.filter(pk=token.pk).delete()[0]:
+            return None
+        return token.user
+
+class EmailToken(models.Model):
+    """Single-use token mailed to a user for activation or password reset"""
+    PURPOSE_ACTIVATION = 'activation'
+    PURPOSE_RESET = 'reset'
+    PURPOSE_CHOICES = [
+        (PURPOSE_ACTIVATION, 'Activation'),
+        (PURPOSE_RESET, 'Password reset'),
+    ]
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='email_tokens',
+    )
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    key_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = EmailTokenManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'purpose'])]
+
+    def __str__(self) -> str:
+        return f'{self.user} {self.purpose}'
+
+class OutgoingEmailManager(models.Manager):
+
+    def enqueue(self, subject, body, to, from_email=None):
+        """Queue a message for run_mail_worker instead of sending it now."""
+        return self.create(
+            subject=subject,
+            body=body,
+            to=list(to),
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        )
+
+class OutgoingEmail(models.Model):
+    """Email outbox, delivered in batches by `manage.py run_mail_worker`"""
+    STATUS_QUEUED = 'queued'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    objects = OutgoingEmailManager()
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
 
-    def clear_email_token(self):
-        """Clears the reset token and its expiration time."""
-        self.email_token = None
-        self.token_expiration = None
-        self.save()
+    def __str__(self) -> str:
+        return f'{self.subject} to {", ".join(self.to)}'
+
+SEARCH_CONFIG = 'english'
+
+def _attr_names(field):
+    """Space separated names of a recipe's tags/ingredients, as a subquery"""
+    relation = Recipe._meta.get_field(field)
+    target = relation.m2m_reverse_field_name()
+    names = relation.remote_field.through.objects.filter(
+        recipe_id=OuterRef('pk'),
+    ).values('recipe_id').annotate(
+        names=StringAgg(f'{target}__name', ' '),
+    ).values('names')
+    return Coalesce(Subquery(names), Value(''), output_field=models.TextField())
+
+class RecipeQuerySet(models.QuerySet):
 
-    def is_email_token_valid(self, token):
-        """Checks if the provided token is valid and not expired."""
-        return self.email_token == token and self.token_expiration > timezone.now()
+    def touch(self, updated_at=None):
+        """
+        Mark every recipe as changed in one UPDATE: bump updated_at and
+        recompute search_vector from its current tags and ingredients.
+        """
+        return self.update(updated_at=updated_at or timezone.now(), search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector(
+                _attr_names('tags'), _attr_names('ingredients'),
+                weight='B', config=SEARCH_CONFIG,
+            )
+            + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+        ))
 
 class Recipe(models.Model):
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=150)
     description = models.TextField(blank=True)
@@ -74,6 +265,24 @@ class Recipe(models.Model):
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField("Ingredient")
     image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # {'thumb': name, 'medium': name, 'large': name}, see recipe.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Progress of the ImageJob making image_variants; blank without an image
+    image_status = models.CharField(
+        max_length=10, choices=IMAGE_STATUS_CHOICES, blank=True, editable=False,
+    )
+    # Also bumped by RecipeQuerySet.touch() when tags/ingredients change
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by core.signals, never written through the ORM directly
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self) -> str:
         return self.title
@@ -82,6 +291,15 @@ class Recipe(models.Model):
 class Tag(models.Model):
     name = models.CharField(max_length=100)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_tag_name_per_user',
+            ),
+        ]
+        indexes = [models.Index(fields=['user', 'updated_at'])]
 
     def __str__(self) -> str:
         return str(self.name)
@@ -89,6 +307,101 @@ class Tag(models.Model):
 class Ingredient(models.Model):
     name = models.CharField(max_length=100)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='unique_ingredient_name_per_user',
+            ),
+        ]
+        indexes = [models.Index(fields=['user', 'updated_at'])]
+
+    def __str__(self) -> str:
+        return str(self.name)
+
+class ImageBlob(models.Model):
+    """
+    One stored image file, shared by every recipe whose upload had the
+    same bytes. See core.blobs.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    # Rendered once per blob and reused by later uploads of the same bytes
+    variants = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.name
+
+class ImageJob(models.Model):
+    """Variant generation for an uploaded image, run by run_image_worker"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    # The image the job was queued for; a newer upload makes it stale
+    image_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self) -> str:
+        return f'{self.image_name} ({self.status})'
+
+class ImageUpload(models.Model):
+    """
+    A chunked recipe image upload in progress; the bytes so far are in a
+    temp file named after the id. See recipe.uploads.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    # Total announced at the start, and how much of it has arrived
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    # Set once the header has been read; empty until enough bytes arrive
+    format = models.CharField(max_length=10, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return f'{self.filename} ({self.offset}/{self.size})'
+
+class Tombstone(models.Model):
+    """Record of a deleted recipe, tag or ingredient, for delta sync"""
+    KIND_RECIPE = 'recipe'
+    KIND_TAG = 'tag'
+    KIND_INGREDIENT = 'ingredient'
+    KIND_CHOICES = [
+        (KIND_RECIPE, 'Recipe'),
+        (KIND_TAG, 'Tag'),
+        (KIND_INGREDIENT, 'Ingredient'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'deleted_at'])]
 
     def __str__(self) -> str:
-        return str(self.name)
\ No newline at end of file
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,131 @@
+"""
+Static and media files for deployments where requests for them reach
+Django.
+
+With SENDFILE_BACKEND set, the response only carries headers and tells
+the web server which file to send ('nginx': X-Accel-Redirect to an
+internal location, 'xsendfile': X-Sendfile for Apache or lighttpd), so
+no file bytes go through Python. Unset, the file is streamed with
+FileResponse, which is meant for development.
+
+Names that change whenever the content does (hashed static files,
+original images from core.blobs) are cached as immutable.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# ManifestStaticFilesStorage's app.<12 hex digits>.css
+HASHED_STATIC = re.compile(r'\.[0-9a-f]{12}\.[^/.]+$')
+# core.models.image_blob_path. Not the variants named after it: their
+# bytes change with RECIPE_IMAGE_VARIANT_QUALITY under the same name
+CONTENT_ADDRESSED = re.compile(r'^uploads/recipe/[0-9a-f]{2}/[0-9a-f]{64}\.[^/._]+$')
+# Precompressed copies written by core.storage, best first
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+
+def _accepted_encodings(header):
+    """Codings in an Accept-Encoding header that have a q-value above 0."""
+    accepted = set()
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def _negotiate(request, fullpath):
+    """The precompressed copy to send and its encoding, if any."""
+    accepted = _accepted_encodings(request.headers.get('Accept-Encoding', ''))
+    has_variants = False
+    for encoding, suffix in ENCODINGS:
+        if os.path.isfile(fullpath + suffix):
+            has_variants = True
+            if encoding in accepted:
+                return fullpath + suffix, encoding, True
+    return fullpath, None, has_variants
+
+
+def serve(request, root, path, location, cache_control, precompressed=False):
+    """
+    Respond with root/path; location is where the nginx internal
+    location for root is mounted under SENDFILE_NGINX_PREFIX.
+    """
+    try:
+        fullpath = safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    if not os.path.isfile(fullpath):
+        raise Http404('Not found')
+
+    mtime = os.stat(fullpath).st_mtime
+    if not was_modified_since(request.headers.get('If-Modified-Since'), mtime):
+        response = HttpResponseNotModified()
+        response['Cache-Control'] = cache_control
+        return response
+
+    content_type = mimetypes.guess_type(fullpath)[0] or 'application/octet-stream'
+    backend = settings.SENDFILE_BACKEND
+    served, encoding, vary = fullpath, None, False
+    # nginx picks the precompressed copy itself with gzip_static/brotli_static
+    if precompressed and backend != 'nginx':
+        served, encoding, vary = _negotiate(request, fullpath)
+
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(
+            f'{settings.SENDFILE_NGINX_PREFIX}{location}{path}',
+        )
+    elif backend == 'xsendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = served
+    else:
+        response = FileResponse(open(served, 'rb'), content_type=content_type)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if vary:
+        patch_vary_headers(response, ['Accept-Encoding'])
+    response['Last-Modified'] = http_date(mtime)
+    response['Cache-Control'] = cache_control
+    return response
+
+
+@require_safe
+def static_file(request, path):
+    """Collected static files, STATIC_ROOT"""
+    if HASHED_STATIC.search(path):
+        cache_control = IMMUTABLE
+    else:
+        cache_control = f'public, max-age={settings.STATIC_MAX_AGE}'
+    return serve(
+        request, settings.STATIC_ROOT, path, 'static/', cache_control, precompressed=True,
+    )
+
+
+@require_safe
+def media_file(request, path):
+    """Uploaded recipe images, MEDIA_ROOT"""
+    if CONTENT_ADDRESSED.match(path):
+        cache_control = IMMUTABLE
+    else:
+        cache_control = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    return serve(request, settings.MEDIA_ROOT, path, 'media/', cache_control)
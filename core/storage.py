@@ -0,0 +1,67 @@
+"""
+Static files storage for collectstatic.
+
+Files get content-hashed names (ManifestStaticFilesStorage) so they can
+be cached forever, and text assets also get gzip and, when the brotli
+package is installed, brotli copies next to them, compressed once at
+build time at the highest level. core.serving picks whichever copy the
+client accepts.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ico', '.ttf', '.otf', '.eot',
+}
+# Below this, headers outweigh what compression saves
+MIN_SIZE = 256
+
+
+def _gzip(data):
+    # mtime=0 keeps the output identical between builds
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+def encoders():
+    """File suffix -> compress function, in order of preference."""
+    found = {'.br': _brotli} if brotli is not None else {}
+    found['.gz'] = _gzip
+    return found
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(paths) | set(self.hashed_files.values()):
+            self.compress(name)
+
+    def compress(self, name):
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE or not self.exists(name):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_SIZE:
+            return
+        for suffix, encode in encoders().items():
+            compressed = encode(data)
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
@@ -1,10 +1,16 @@
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from core.models import AuthToken, EmailToken, Tombstone
 
 @patch("core.management.commands.wait_for_db.Command.check")
 class CommandTests(SimpleTestCase):
@@ -25,4 +31,56 @@ class CommandTests(SimpleTestCase):
         
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_check.assert_called_with(databases=['default'])
+
+
+class PurgeTombstonesCommandTests(TestCase):
+
+    def test_purge_expired_tombstones(self):
+        user = get_user_model().objects.create_user('user@example.com', 'pass@123')
+        for object_id in range(3):
+            Tombstone.objects.create(user=user, kind='recipe', object_id=object_id)
+        Tombstone.objects.filter(object_id__lt=2).update(
+            deleted_at=timezone.now() - timedelta(days=365),
+        )
+        out = StringIO()
+
+        call_command('purge_tombstones', batch_size=1, stdout=out)
+
+        self.assertEqual(
+            list(Tombstone.objects.values_list('object_id', flat=True)), [2],
+        )
+        self.assertIn('Deleted 2 tombstones', out.getvalue())
+
+
+class PurgeTokensCommandTests(TestCase):
+
+    def test_purge_expired_tokens(self):
+        user = get_user_model().objects.create_user('user@example.com', 'pass@123')
+        for name in ('old', 'older', 'current'):
+            AuthToken.objects.create_token(user, name=name)
+        AuthToken.objects.exclude(name='current').update(
+            expires_at=timezone.now() - timedelta(days=1),
+        )
+        out = StringIO()
+
+        call_command('purge_tokens', batch_size=1, stdout=out)
+
+        self.assertEqual(
+            list(AuthToken.objects.values_list('name', flat=True)), ['current'],
+        )
+        self.assertIn('Deleted 2 tokens', out.getvalue())
+
+    def test_purge_expired_email_tokens(self):
+        user = get_user_model().objects.create_user('user@example.com', 'pass@123')
+        EmailToken.objects.create_token(user, EmailToken.PURPOSE_ACTIVATION)
+        current, _ = EmailToken.objects.create_token(user, EmailToken.PURPOSE_RESET)
+        EmailToken.objects.exclude(pk=current.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        out = StringIO()
+
+        call_command('purge_tokens', stdout=out)
+
+        self.assertEqual(list(EmailToken.objects.all()), [current])
+        self.assertIn('1 email tokens', out.getvalue())
@@ -0,0 +1,95 @@
+"""
+Tests for the email outbox
+"""
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.mail import send_queued_emails
+from core.models import OutgoingEmail
+
+
+def enqueue(count=1):
+    return [
+        OutgoingEmail.objects.enqueue(f'Subject {n}', 'Body', [f'user{n}@example.com'])
+        for n in range(count)
+    ]
+
+
+class SendQueuedEmailsTests(TestCase):
+
+    def test_sends_batch_over_one_connection(self):
+        enqueue(3)
+
+        with patch('core.mail.get_connection', wraps=mail.get_connection) as patched:
+            sent, failed = send_queued_emails(batch_size=2)
+
+        patched.assert_called_once()
+        self.assertEqual((sent, failed), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            OutgoingEmail.objects.filter(status=OutgoingEmail.STATUS_SENT).count(), 2,
+        )
+
+    def test_skips_messages_not_yet_due(self):
+        email, = enqueue()
+        OutgoingEmail.objects.filter(pk=email.pk).update(
+            next_attempt_at=timezone.now() + timedelta(minutes=1),
+        )
+
+        self.assertEqual(send_queued_emails(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    @patch('core.mail.EmailMessage.send', side_effect=OSError('refused'))
+    def test_failure_retried_with_backoff(self, patched_send):
+        email, = enqueue()
+
+        send_queued_emails(base_delay=60)
+        email.refresh_from_db()
+        first_retry = email.next_attempt_at
+
+        self.assertEqual(email.status, OutgoingEmail.STATUS_QUEUED)
+        self.assertEqual(email.attempts, 1)
+        self.assertIn('refused', email.last_error)
+        self.assertGreater(first_retry, timezone.now() + timedelta(seconds=55))
+
+        OutgoingEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        send_queued_emails(base_delay=60)
+        email.refresh_from_db()
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=115))
+
+    @patch('core.mail.EmailMessage.send', side_effect=OSError('refused'))
+    def test_gives_up_after_max_attempts(self, patched_send):
+        email, = enqueue()
+
+        send_queued_emails(max_attempts=1)
+
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.STATUS_FAILED)
+
+    @patch('core.mail.get_connection')
+    def test_connection_failure_retries_whole_batch(self, patched_connection):
+        patched_connection.return_value.__enter__.side_effect = OSError('no route')
+        enqueue(2)
+
+        self.assertEqual(send_queued_emails(), (0, 2))
+        self.assertEqual(
+            list(OutgoingEmail.objects.values_list('attempts', flat=True)), [1, 1],
+        )
+
+
+class RunMailWorkerCommandTests(TestCase):
+
+    def test_once_drains_outbox(self):
+        enqueue(5)
+        out = StringIO()
+
+        call_command('run_mail_worker', once=True, batch_size=2, stdout=out)
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertIn('Sent 5 emails', out.getvalue())
@@ -77,6 +77,18 @@ class ModelTests(TestCase):
         ingredient = models.Ingredient.objects.create(user=user, name="Ingredient1")
 
         self.assertEqual(str(ingredient), ingredient.name)
+
+    def test_create_auth_token_stores_hash(self):
+        user = get_user_model().objects.create_user(
+            "test@example.com",
+            "testpass@123",
+        )
+        token, key = models.AuthToken.objects.create_token(user, name="phone")
+
+        self.assertTrue(key.startswith(f"{token.prefix}."))
+        self.assertEqual(token.key_hash, models.AuthToken.hash_key(key))
+        self.assertNotIn(key.split(".")[1], token.key_hash)
+        self.assertFalse(token.is_expired())
         
     @patch('core.models.uuid.uuid4')
     def test_recipe_file_name_uuid(self, mock_uuid):
@@ -86,4 +98,11 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'example.jpg')
         print(file_path)
         self.assertEqual(file_path, os.path.join('uploads', 'recipe', f'{uuid}.jpg'))
-        
\ No newline at end of file
+        
+
+    def test_image_blob_path_from_digest(self):
+        digest = 'ab' + '0' * 62
+
+        file_path = models.image_blob_path(digest, 'Photo.JPG')
+
+        self.assertEqual(file_path, os.path.join('uploads', 'recipe', 'ab', f'{digest}.jpg'))
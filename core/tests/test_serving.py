@@ -0,0 +1,166 @@
+"""
+Tests for static and media file serving
+"""
+import gzip
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.test import SimpleTestCase
+from django.utils.http import http_date
+
+from core.storage import CompressedManifestStaticFilesStorage
+
+DIGEST = 'ab' + '0' * 62
+CSS = b'body { color: black; }\n' * 50
+
+
+class ServingTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.static_root = os.path.join(root.name, 'static')
+        self.media_root = os.path.join(root.name, 'media')
+        root_settings = self.settings(
+            STATIC_ROOT=self.static_root, MEDIA_ROOT=self.media_root, SENDFILE_BACKEND=None,
+        )
+        root_settings.enable()
+        self.addCleanup(root_settings.disable)
+
+    def write(self, root, name, content=b'data'):
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(content)
+        return path
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers=headers)
+
+    def test_content_addressed_image_is_immutable(self):
+        name = f'uploads/recipe/ab/{DIGEST}.jpg'
+        self.write(self.media_root, name, b'jpeg bytes')
+
+        res = self.get(settings.MEDIA_URL + name)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(b''.join(res.streaming_content), b'jpeg bytes')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_legacy_image_gets_short_max_age(self):
+        self.write(self.media_root, 'uploads/recipe/photo.jpg')
+
+        res = self.get(settings.MEDIA_URL + 'uploads/recipe/photo.jpg')
+
+        self.assertEqual(res['Cache-Control'], f'public, max-age={settings.MEDIA_MAX_AGE}')
+
+    def test_image_variant_gets_short_max_age(self):
+        name = f'uploads/recipe/ab/{DIGEST}_thumb.webp'
+        self.write(self.media_root, name)
+
+        res = self.get(settings.MEDIA_URL + name)
+
+        self.assertEqual(res['Cache-Control'], f'public, max-age={settings.MEDIA_MAX_AGE}')
+
+    def test_nginx_backend_hands_off_file(self):
+        name = f'uploads/recipe/ab/{DIGEST}.jpg'
+        self.write(self.media_root, name)
+
+        with self.settings(SENDFILE_BACKEND='nginx', SENDFILE_NGINX_PREFIX='/internal/'):
+            res = self.get(settings.MEDIA_URL + name)
+
+        self.assertEqual(res['X-Accel-Redirect'], f'/internal/media/{name}')
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    def test_xsendfile_backend_hands_off_file(self):
+        path = self.write(self.media_root, 'uploads/recipe/photo.jpg')
+
+        with self.settings(SENDFILE_BACKEND='xsendfile'):
+            res = self.get(settings.MEDIA_URL + 'uploads/recipe/photo.jpg')
+
+        self.assertEqual(res['X-Sendfile'], path)
+        self.assertEqual(res.content, b'')
+
+    def test_precompressed_static_file(self):
+        self.write(self.static_root, 'app.0123456789ab.css', CSS)
+        self.write(self.static_root, 'app.0123456789ab.css.gz', gzip.compress(CSS))
+        url = settings.STATIC_URL + 'app.0123456789ab.css'
+
+        res = self.get(url, accept_encoding='gzip, deflate')
+
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertEqual(res['Content-Type'], 'text/css')
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        self.assertEqual(res['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(gzip.decompress(b''.join(res.streaming_content)), CSS)
+        # Clients that don't accept it get the original
+        res = self.get(url)
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(b''.join(res.streaming_content), CSS)
+
+    def test_refused_encoding_not_sent(self):
+        self.write(self.static_root, 'app.0123456789ab.css', CSS)
+        self.write(self.static_root, 'app.0123456789ab.css.gz', gzip.compress(CSS))
+
+        res = self.get(
+            settings.STATIC_URL + 'app.0123456789ab.css', accept_encoding='gzip;q=0, deflate',
+        )
+
+        self.assertFalse(res.has_header('Content-Encoding'))
+        self.assertEqual(res['Vary'], 'Accept-Encoding')
+        self.assertEqual(b''.join(res.streaming_content), CSS)
+
+    def test_unhashed_static_file_gets_short_max_age(self):
+        self.write(self.static_root, 'app.css', CSS)
+
+        res = self.get(settings.STATIC_URL + 'app.css')
+
+        self.assertEqual(res['Cache-Control'], f'public, max-age={settings.STATIC_MAX_AGE}')
+
+    def test_not_modified(self):
+        path = self.write(self.media_root, 'uploads/recipe/photo.jpg')
+
+        res = self.get(
+            settings.MEDIA_URL + 'uploads/recipe/photo.jpg',
+            if_modified_since=http_date(os.stat(path).st_mtime),
+        )
+
+        self.assertEqual(res.status_code, 304)
+
+    def test_outside_root_not_served(self):
+        self.write(self.static_root, 'secret.txt')
+
+        res = self.get(settings.MEDIA_URL + '../static/secret.txt')
+
+        self.assertEqual(res.status_code, 404)
+
+
+class CompressedManifestStorageTests(SimpleTestCase):
+
+    def test_collectstatic_writes_compressed_copies(self):
+        source_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(source_dir.cleanup)
+        target_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(target_dir.cleanup)
+        source = FileSystemStorage(location=source_dir.name)
+        source.save('app.css', ContentFile(CSS))
+        source.save('logo.png', ContentFile(b'\x89PNG' * 100))
+        storage = CompressedManifestStaticFilesStorage(location=target_dir.name)
+        for name in ('app.css', 'logo.png'):
+            with source.open(name) as f:
+                storage.save(name, f)
+
+        list(storage.post_process({
+            'app.css': (source, 'app.css'), 'logo.png': (source, 'logo.png'),
+        }))
+
+        hashed = storage.hashed_files['app.css']
+        self.assertNotEqual(hashed, 'app.css')
+        with storage.open(hashed + '.gz') as f:
+            self.assertEqual(gzip.decompress(f.read()), CSS)
+        self.assertFalse(storage.exists(storage.hashed_files['logo.png'] + '.gz'))
@@ -0,0 +1,146 @@
+"""
+Set-based writes for many recipes at once
+"""
+import time
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+
+from core.cache import bump_generation
+from core.models import Recipe, Tag, Ingredient
+from recipe.serializers import bulk_get_or_create
+
+ATTR_MODELS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def validate_items(serializer, items):
+    """
+    Validate each item with a single serializer instance.
+    Returns ([(index, validated_data)], [{'index', 'errors'}]).
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, serializer.run_validation(item)))
+        except serializers.ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+    return valid, errors
+
+
+def _resolve_attrs(user, field, items):
+    """Map every tag/ingredient name used by items to its object."""
+    names = [attr['name'] for data in items for attr in data.get(field) or []]
+    return {
+        obj.name: obj
+        for obj in bulk_get_or_create(ATTR_MODELS[field], user, names)
+    }
+
+
+def _link_attrs(user, recipe_attrs, field):
+    """
+    Make each recipe's tags/ingredients exactly the given list, with one
+    SELECT, one DELETE and one INSERT on the through table in total.
+    recipe_attrs is [(recipe, [{'name': ...}, ...])].
+    """
+    if not recipe_attrs:
+        return
+    relation = Recipe._meta.get_field(field)
+    through = relation.remote_field.through
+    target = f'{relation.m2m_reverse_field_name()}_id'
+    by_name = _resolve_attrs(user, field, [{field: attrs} for _, attrs in recipe_attrs])
+
+    wanted = {
+        (recipe.id, by_name[attr['name']].id)
+        for recipe, attrs in recipe_attrs for attr in attrs
+    }
+    current = {
+        (recipe_id, attr_id): link_id
+        for link_id, recipe_id, attr_id in through.objects.filter(
+            recipe_id__in=[recipe.id for recipe, _ in recipe_attrs],
+        ).values_list('id', 'recipe_id', target)
+    }
+    stale = [link_id for pair, link_id in current.items() if pair not in wanted]
+    if stale:
+        through.objects.filter(id__in=stale).delete()
+    through.objects.bulk_create([
+        through(recipe_id=recipe_id, **{target: attr_id})
+        for recipe_id, attr_id in wanted if (recipe_id, attr_id) not in current
+    ])
+
+
+def _link_all_attrs(user, recipes, items):
+    for field in ATTR_MODELS:
+        _link_attrs(user, [
+            (recipe, data[field])
+            for recipe, data in zip(recipes, items) if data.get(field) is not None
+        ], field)
+
+
+@transaction.atomic
+def bulk_create_recipes(user, items):
+    """Create recipes from validated data with a fixed number of queries."""
+    recipes = Recipe.objects.bulk_create([
+        Recipe(user=user, **{
+            key: val for key, val in data.items() if key not in ATTR_MODELS
+        })
+        for data in items
+    ])
+    _link_all_attrs(user, recipes, items)
+    # bulk_create and through-table writes bypass the signal handlers
+    Recipe.objects.filter(pk__in=[r.pk for r in recipes]).touch()
+    bump_generation(user.id)
+    return recipes
+
+
+@transaction.atomic
+def bulk_update_recipes(user, recipes, items):
+    """Apply validated (partial) data to the matching recipe objects."""
+    fields = set()
+    for recipe, data in zip(recipes, items):
+        for key, val in data.items():
+            if key not in ATTR_MODELS:
+                setattr(recipe, key, val)
+                fields.add(key)
+    if fields:
+        Recipe.objects.bulk_update(recipes, sorted(fields))
+    _link_all_attrs(user, recipes, items)
+    Recipe.objects.filter(pk__in=[r.pk for r in recipes]).touch()
+    bump_generation(user.id)
+    return recipes
+
+
+def import_rows(user, rows, serializer, batch_size=500, max_errors=100,
+                on_batch=None):
+    """
+    Validate and insert (row_number, data) pairs in fixed-size batches,
+    each batch in its own transaction, without holding more than one
+    batch in memory. Returns counts, up to max_errors row errors and the
+    throughput; on_batch(stats) is called after every batch.
+    """
+    stats = {'rows': 0, 'created': 0, 'error_count': 0, 'errors': []}
+    started = time.monotonic()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        valid = []
+        for number, data in batch:
+            try:
+                if isinstance(data, Exception):
+                    raise serializers.ValidationError(str(data))
+                valid.append(serializer.run_validation(data))
+            except serializers.ValidationError as exc:
+                stats['error_count'] += 1
+                if len(stats['errors']) < max_errors:
+                    stats['errors'].append({'row': number, 'errors': exc.detail})
+        stats['created'] += len(bulk_create_recipes(user, valid))
+        stats['rows'] += len(batch)
+        if on_batch:
+            on_batch(stats)
+
+    elapsed = time.monotonic() - started
+    stats['seconds'] = round(elapsed, 3)
+    stats['rows_per_second'] = round(stats['rows'] / elapsed) if elapsed else 0
+    return stats
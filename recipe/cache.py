@@ -0,0 +1,125 @@
+"""
+Cached list responses and conditional requests for recipe resources
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import get_cache, get_generation, is_enabled
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or etag in etags
+
+
+def _not_modified(etag):
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+class CachedListMixin:
+    """
+    Serve list() straight from the rendered bytes of an earlier identical
+    request, as long as the user's library hasn't changed since.
+    Only JSON responses are cached.
+    """
+
+    def _list_cache_key(self, request):
+        if not is_enabled() or request.accepted_renderer.format != 'json':
+            return None
+        query = urlencode(sorted(request.query_params.lists()), doseq=True)
+        # Absolute so cached pagination links match the requested host
+        url = request.build_absolute_uri(request.path) + '?' + query
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        generation = get_generation(request.user.id)
+        return f'recipe:list:{request.user.id}:{generation}:{digest}'
+
+    def list(self, request, *args, **kwargs):
+        key = self._list_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+
+        # The key changes with the user's generation, so it doubles as the
+        # collection version.
+        etag = quote_etag(hashlib.sha256(key.encode()).hexdigest()[:32])
+        if _etag_matches(request.headers.get('If-None-Match'), etag):
+            return _not_modified(etag)
+
+        cached = get_cache().get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(
+                content, content_type=content_type, headers={'ETag': etag},
+            )
+
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+
+        def store(rendered):
+            if rendered.status_code == 200:
+                get_cache().set(
+                    key,
+                    (rendered.content, rendered['Content-Type']),
+                    settings.RECIPE_CACHE_TIMEOUT,
+                )
+
+        response.add_post_render_callback(store)
+        return response
+
+
+class ConditionalRecipeMixin:
+    """
+    Strong ETags for single recipes derived from Recipe.updated_at, read
+    with a one-column query, and the negotiated renderer: If-None-Match
+    answers 304 without loading or serializing the recipe, If-Match makes
+    PUT/PATCH fail with 412 when someone else changed the recipe first.
+    """
+
+    def _recipe_etag(self, lock=False):
+        queryset = self.queryset.filter(
+            user=self.request.user, pk=self.kwargs[self.lookup_field],
+        )
+        if lock:
+            queryset = queryset.select_for_update()
+        try:
+            updated_at = queryset.values_list('updated_at', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+        if updated_at is None:
+            return None
+        pk = self.kwargs[self.lookup_field]
+        # One validator per representation: JSON and the browsable API differ
+        renderer = self.request.accepted_renderer.format
+        return quote_etag(f'{pk}-{updated_at.timestamp():.6f}-{renderer}')
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self._recipe_etag()
+        if etag and _etag_matches(request.headers.get('If-None-Match'), etag):
+            return _not_modified(etag)
+        response = super().retrieve(request, *args, **kwargs)
+        if etag:
+            response['ETag'] = etag
+        return response
+
+    def update(self, request, *args, **kwargs):
+        if_match = request.headers.get('If-Match')
+        with transaction.atomic():
+            etag = self._recipe_etag(lock=bool(if_match))
+            if if_match and etag and not _etag_matches(if_match, etag):
+                return Response(
+                    {'detail': 'Recipe has changed, fetch it again.'},
+                    status.HTTP_412_PRECONDITION_FAILED,
+                )
+            response = super().update(request, *args, **kwargs)
+        etag = self._recipe_etag()
+        if etag and response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+        return response
@@ -0,0 +1,177 @@
+"""
+Row formats for exporting and importing a recipe library
+"""
+import csv
+import json
+import os
+
+FIELDS = [
+    'id', 'title', 'description', 'time_minutes', 'price', 'link',
+    'tags', 'ingredients',
+]
+# Separator for tag/ingredient names inside a single CSV cell; a name
+# that contains it (or the escape character) has it backslash-escaped
+CSV_LIST_SEPARATOR = ';'
+CSV_ESCAPE = '\\'
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def recipe_to_row(recipe):
+    """Flatten a recipe with prefetched tags/ingredients into a dict."""
+    return {
+        'id': recipe.id,
+        'title': recipe.title,
+        'description': recipe.description,
+        'time_minutes': recipe.time_minutes,
+        'price': str(recipe.price),
+        'link': recipe.link,
+        'tags': [tag.name for tag in recipe.tags.all()],
+        'ingredients': [ing.name for ing in recipe.ingredients.all()],
+    }
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _join_names(names):
+    return CSV_LIST_SEPARATOR.join(
+        name.replace(CSV_ESCAPE, CSV_ESCAPE * 2)
+        .replace(CSV_LIST_SEPARATOR, CSV_ESCAPE + CSV_LIST_SEPARATOR)
+        for name in names
+    )
+
+
+def _split_names(value):
+    """Inverse of _join_names; an unescaped separator ends a name."""
+    names, current, chars = [], [], iter(value)
+    for char in chars:
+        if char == CSV_ESCAPE:
+            current.append(next(chars, ''))
+        elif char == CSV_LIST_SEPARATOR:
+            names.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    names.append(''.join(current))
+    return names
+
+
+def write_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + '\n'
+
+
+def write_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow([
+            _join_names(row[field])
+            if isinstance(row[field], list) else row[field]
+            for field in FIELDS
+        ])
+
+
+WRITERS = {'ndjson': write_ndjson, 'csv': write_csv}
+
+
+def _attrs(value):
+    """Accept names as a list of strings/dicts or a separated string."""
+    if isinstance(value, str):
+        value = [name for name in _split_names(value) if name.strip()]
+    if not isinstance(value, list):
+        return value
+    return [
+        {'name': item.strip()} if isinstance(item, str) else item
+        for item in value
+    ]
+
+
+def row_to_data(row):
+    """Turn an exported row back into RecipeSerializer input."""
+    data = dict(row)
+    for field in ('tags', 'ingredients'):
+        if field in data:
+            data[field] = _attrs(data[field])
+    return data
+
+
+class _Lines:
+    """
+    Iterate lines up to the first one that is not valid UTF-8, which the
+    reader then reports as its last row instead of raising mid-import.
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.undecodable = False
+
+    def __iter__(self):
+        try:
+            yield from self.lines
+        except UnicodeDecodeError:
+            self.undecodable = True
+
+
+NOT_UTF8 = 'Not valid UTF-8; the rest of the file was not read.'
+
+
+def read_ndjson(lines):
+    """Yield (line_number, data) lazily; data is the error if unparsable."""
+    lines = _Lines(lines)
+    number = 0
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, exc
+            continue
+        yield number, row_to_data(row) if isinstance(row, dict) else row
+    if lines.undecodable:
+        yield number + 1, ValueError(NOT_UTF8)
+
+
+def read_csv(lines):
+    lines = _Lines(lines)
+    reader = csv.DictReader(lines)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            break
+        except csv.Error as exc:
+            # DictReader.line_num is only updated for rows that parsed
+            yield reader.reader.line_num, exc
+            continue
+        yield reader.line_num, row_to_data(row)
+    if lines.undecodable:
+        yield reader.reader.line_num + 1, ValueError(NOT_UTF8)
+
+
+READERS = {'ndjson': read_ndjson, 'csv': read_csv}
+
+
+def format_for(filename, default='ndjson'):
+    ext = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return ext if ext in READERS else default
+
+
+def _decode(binary_file):
+    # Line by line, so the rows before an undecodable byte still import
+    for number, line in enumerate(binary_file):
+        yield line.decode('utf-8-sig' if number == 0 else 'utf-8')
+
+
+def read_file(binary_file, file_format):
+    """Parse an open binary file line by line in the given format."""
+    return READERS[file_format](_decode(binary_file))
@@ -0,0 +1,169 @@
+"""
+Resized variants of recipe images, stored next to the original.
+
+Uploads only queue an ImageJob; `manage.py run_image_worker` renders the
+variants in a process pool and attaches them to the recipe.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from core.blobs import acquire_blob, get_storage, release_blob
+from core.models import ImageBlob, ImageJob, Recipe
+
+# Longest edge in pixels; smaller images are never scaled up
+VARIANTS = {
+    'thumb': 160,
+    'medium': 640,
+    'large': 1280,
+}
+EXTENSIONS = {'WEBP': 'webp', 'AVIF': 'avif'}
+
+
+def variant_format():
+    """The configured format, or WebP if this Pillow can't encode it."""
+    fmt = settings.RECIPE_IMAGE_VARIANT_FORMAT.upper()
+    if fmt in EXTENSIONS and features.check(fmt.lower()):
+        return fmt
+    return 'WEBP'
+
+
+def variant_name(image_name, variant, fmt):
+    """uploads/recipe/<name>.jpg -> uploads/recipe/<name>_thumb.webp"""
+    return f'{os.path.splitext(image_name)[0]}_{variant}.{EXTENSIONS[fmt]}'
+
+
+def delete_variants(variants):
+    storage = get_storage()
+    for name in variants.values():
+        storage.delete(name)
+
+
+def generate_variants(image_file, image_name):
+    """
+    Decode the image once and write every variant without EXIF (after
+    applying its orientation). Returns {variant: storage name}.
+    """
+    storage = get_storage()
+    fmt = variant_format()
+    with Image.open(image_file) as source:
+        source = ImageOps.exif_transpose(source)
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA' if 'transparency' in source.info else 'RGB')
+
+        variants = {}
+        for variant, size in VARIANTS.items():
+            resized = source.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, fmt, quality=settings.RECIPE_IMAGE_VARIANT_QUALITY)
+            name = variant_name(image_name, variant, fmt)
+            storage.delete(name)
+            variants[variant] = storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def render_variants(image_name):
+    """Variants for a stored image; runs in run_image_worker's processes."""
+    with get_storage().open(image_name, 'rb') as image_file:
+        return generate_variants(image_file, image_name)
+
+
+@transaction.atomic
+def store_image(recipe, image_file):
+    """
+    Point the recipe at the stored copy of image_file, sharing it with
+    any earlier upload of the same bytes, and queue its variants.
+    """
+    old_name, old_variants = recipe.image.name, recipe.image_variants
+    recipe.image.name = acquire_blob(image_file)
+    release_blob(old_name, old_variants.values())
+    if recipe.image.name != old_name:
+        queue_variants(recipe)
+
+
+@transaction.atomic
+def queue_variants(recipe):
+    """
+    Mark the recipe's new image pending and queue its variants, or reuse
+    the variants already rendered for the same file.
+    """
+    ImageJob.objects.filter(recipe=recipe, status=ImageJob.STATUS_QUEUED).delete()
+    rendered = ImageBlob.objects.filter(name=recipe.image.name).values_list(
+        'variants', flat=True,
+    ).first()
+    if rendered:
+        recipe.image_variants = rendered
+        recipe.image_status = Recipe.IMAGE_READY
+    else:
+        ImageJob.objects.create(recipe=recipe, image_name=recipe.image.name)
+        recipe.image_variants = {}
+        recipe.image_status = Recipe.IMAGE_PENDING
+    recipe.save(update_fields=['image', 'image_variants', 'image_status', 'updated_at'])
+
+
+def requeue_stalled(stalled_after):
+    """Give jobs whose worker died back to the queue."""
+    return ImageJob.objects.filter(
+        status=ImageJob.STATUS_RUNNING,
+        started_at__lt=timezone.now() - stalled_after,
+    ).update(status=ImageJob.STATUS_QUEUED)
+
+
+@transaction.atomic
+def claim_jobs(batch_size):
+    """Mark up to batch_size queued jobs running; safe across workers."""
+    jobs = list(
+        ImageJob.objects.select_for_update(skip_locked=True).filter(
+            status=ImageJob.STATUS_QUEUED,
+        ).order_by('created_at')[:batch_size]
+    )
+    now = timezone.now()
+    for job in jobs:
+        job.status = ImageJob.STATUS_RUNNING
+        job.started_at = now
+        job.attempts += 1
+    ImageJob.objects.bulk_update(jobs, ['status', 'started_at', 'attempts'])
+    return jobs
+
+
+@transaction.atomic
+def finish_job(job, variants):
+    """
+    Attach the variants, unless the recipe got another image meanwhile.
+    Replaced variants belong to the old file and go with it (core.blobs).
+    """
+    # Later uploads of the same file reuse these
+    has_blob = ImageBlob.objects.filter(name=job.image_name).update(variants=variants)
+    recipe = Recipe.objects.select_for_update().filter(pk=job.recipe_id).first()
+    if recipe is not None and recipe.image.name == job.image_name:
+        recipe.image_variants = variants
+        recipe.image_status = Recipe.IMAGE_READY
+        recipe.save(update_fields=['image_variants', 'image_status', 'updated_at'])
+    elif not has_blob:
+        # The file is gone already, so nothing else would delete these
+        delete_variants(variants)
+    job.status = ImageJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+
+
+@transaction.atomic
+def fail_job(job, error, max_attempts):
+    """Retry the job later, or give up on it after max_attempts."""
+    job.last_error = f'{type(error).__name__}: {error}'
+    if job.attempts < max_attempts:
+        job.status = ImageJob.STATUS_QUEUED
+    else:
+        job.status = ImageJob.STATUS_FAILED
+        job.finished_at = timezone.now()
+        recipe = Recipe.objects.filter(pk=job.recipe_id, image=job.image_name).first()
+        if recipe is not None:
+            recipe.image_status = Recipe.IMAGE_FAILED
+            recipe.save(update_fields=['image_status', 'updated_at'])
+    job.save(update_fields=['status', 'last_error', 'finished_at'])
@@ -0,0 +1,49 @@
+"""
+Django command to import a recipe library from an NDJSON or CSV file
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe import bulk, formats
+from recipe.serializers import RecipeDetailSerializer
+
+
+class Command(BaseCommand):
+    """Import recipes for a user from a file exported by the API."""
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON or CSV file to import')
+        parser.add_argument('--user', required=True, help='Email of the owner')
+        parser.add_argument(
+            '--format', choices=list(formats.READERS),
+            help='File format, guessed from the extension by default',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user with email {options['user']}")
+        file_format = options['format'] or formats.format_for(options['path'])
+
+        def report(stats):
+            self.stdout.write(f"{stats['rows']} rows read, {stats['created']} created")
+
+        with open(options['path'], 'rb') as import_file:
+            stats = bulk.import_rows(
+                user,
+                formats.read_file(import_file, file_format),
+                RecipeDetailSerializer(),
+                batch_size=options['batch_size'],
+                on_batch=report,
+            )
+
+        for error in stats['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['created']} of {stats['rows']} rows "
+            f"({stats['error_count']} errors) in {stats['seconds']}s, "
+            f"{stats['rows_per_second']} rows/s"
+        ))
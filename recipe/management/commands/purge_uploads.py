@@ -0,0 +1,15 @@
+"""
+Django command to delete abandoned chunked image uploads
+"""
+from django.core.management.base import BaseCommand
+
+from recipe import uploads
+
+
+class Command(BaseCommand):
+    """Discard expired uploads and their temp files."""
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        purged = uploads.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {purged} expired uploads'))
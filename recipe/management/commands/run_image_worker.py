@@ -0,0 +1,102 @@
+"""
+Django command to render queued recipe image variants
+"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from recipe import images
+
+
+class InlineExecutor:
+    """Runs jobs in this process, for --workers 0 (tests, debugging)."""
+
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+
+    def shutdown(self):
+        pass
+
+
+class Command(BaseCommand):
+    """Render variants for queued images in a process pool, polling until stopped."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Worker processes; 0 renders in this process.',
+        )
+        parser.add_argument('--batch-size', type=int, default=8)
+        parser.add_argument('--max-attempts', type=int, default=3)
+        parser.add_argument(
+            '--stalled-after', type=int, default=600,
+            help='Seconds after which a running job is assumed lost and requeued.',
+        )
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Seconds to sleep when the queue is empty.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit once the queue is empty.',
+        )
+
+    def render(self, executor, jobs):
+        """Yield (job, variants or exception) as each render finishes."""
+        futures = {
+            executor.submit(images.render_variants, job.image_name): job for job in jobs
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.exception() or future.result()
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        if options['workers']:
+            # Forked so children inherit the configured Django; they only
+            # touch storage. Closed first so no DB socket is shared with
+            # them, and forked right away (the pool forks on first submit)
+            # before anything reconnects.
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=options['workers'],
+                mp_context=multiprocessing.get_context('fork'),
+            )
+            executor.submit(os.getpid).result()
+        else:
+            executor = InlineExecutor()
+
+        done = failed = 0
+        try:
+            while True:
+                images.requeue_stalled(timedelta(seconds=options['stalled_after']))
+                jobs = images.claim_jobs(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+
+                for job, result in self.render(executor, jobs):
+                    if isinstance(result, Exception):
+                        images.fail_job(job, result, options['max_attempts'])
+                        failed += 1
+                        self.stderr.write(f'{job.image_name}: {result}')
+                    else:
+                        images.finish_job(job, result)
+                        done += 1
+        finally:
+            executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {done} images ({failed} failed attempts)'
+        ))
@@ -1,128 +1,165 @@
-from core.models import Recipe, Tag, Ingredient
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import bump_generation
+from core.models import ImageUpload, Recipe, Tag, Ingredient
 
 from rest_framework import serializers
 
-class IngredientSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Ingredient
-        fields = ['id', 'name']
-        read_only_fields = ['id']
+from recipe import images
+
+
+def bulk_get_or_create(model, user, names):
+    """
+    Return the user's tags/ingredients with the given names, in order,
+    creating the missing ones with a single INSERT.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    found = {obj.name: obj for obj in model.objects.filter(user=user, name__in=names)}
+    missing = [name for name in names if name not in found]
+    if missing:
+        # A concurrent request may create the same names; the unique
+        # (user, name) constraint turns that into a no-op we re-read below.
+        model.objects.bulk_create(
+            [model(user=user, name=name) for name in missing],
+            ignore_conflicts=True,
+        )
+        found.update(
+            (obj.name, obj)
+            for obj in model.objects.filter(user=user, name__in=missing)
+        )
+        bump_generation(user.id)
+    return [found[name] for name in names]
+
+
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """Base serializer for the recipe attributes, tags and ingredients"""
 
     def update(self, instance, validated_data):
         new_name = validated_data.get('name', instance.name)
         user = self.context['request'].user
 
         if new_name != instance.name:
-            try:
-                # Try to get the existing ingredient with the new name
-                existing_ing = Ingredient.objects.get(name=new_name, user=user)
-            except Ingredient.DoesNotExist:
-                existing_ing = None
-            
-            if existing_ing:
-                # Reassign all recipes from the current ingredient 
-                # to the existing ingredient
-                recipes = instance.recipe_set.all()
-                for recipe in recipes:
-                    recipe.ingredients.remove(instance)
-                    recipe.ingredients.add(existing_ing)
-
-                # Delete the old ingredient
-                instance.delete()
-
-                # Return the updated existing ingredient
-                return existing_ing
+            existing = self.Meta.model.objects.filter(
+                name=new_name, user=user,
+            ).first()
+            if existing:
+                # Renaming onto an existing name merges the two
+                self._merge(instance, existing)
+                return existing
         
-        # Update the current ingredient if no name conflict
+        # Update the current attribute if no name conflict
         instance.name = new_name
         instance.save()
         return instance
 
-class TagSerializer(serializers.ModelSerializer):
+    @transaction.atomic
+    def _merge(self, instance, existing):
+        """
+        Move every recipe link of instance onto existing and delete
+        instance, with a constant number of queries however many recipes
+        use it.
+        """
+        relation = self.Meta.model._meta.get_field('recipe')
+        through = relation.through
+        target = relation.field.m2m_reverse_field_name()
+        links = through.objects.filter(**{target: instance})
+        # Only these recipes' tags/ingredients change, not every recipe
+        # already using existing
+        changed = list(links.values_list('recipe_id', flat=True))
+
+        # Recipes already linked to both would collide on (recipe, attr)
+        links.filter(
+            recipe_id__in=through.objects.filter(
+                **{target: existing},
+            ).values('recipe_id'),
+        ).delete()
+        links.update(**{target: existing})
+        # Queryset updates bypass m2m_changed, so mark the recipes changed here
+        Recipe.objects.filter(id__in=changed).touch()
+
+        instance.delete()
+
+class IngredientSerializer(RecipeAttrSerializer):
+
+    class Meta:
+        model = Ingredient
+        fields = ['id', 'name']
+        read_only_fields = ['id']
+
+class TagSerializer(RecipeAttrSerializer):
     
     class Meta:
         model = Tag
         fields = ['id', 'name'] 
         read_only_fields = ['id']
 
-    def update(self, instance, validated_data):
-        new_name = validated_data.get('name', instance.name)
-        user = self.context['request'].user
+class ImageVariantsField(serializers.Field):
+    """URLs of the recipe's resized images, or of one if variant is given"""
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def _url(self, name):
+        url = images.get_storage().url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def to_representation(self, variants):
+        if self.variant:
+            name = variants.get(self.variant)
+            return self._url(name) if name else None
+        return {variant: self._url(name) for variant, name in variants.items()}
 
-        if new_name != instance.name:
-            try:
-                # Try to get the existing tag with the new name
-                existing_tag = Tag.objects.get(name=new_name, user=user)
-            except Tag.DoesNotExist:
-                existing_tag = None
-            
-            if existing_tag:
-                # Reassign all recipes from the current tag to the existing tag
-                recipes = instance.recipe_set.all()
-                for recipe in recipes:
-                    recipe.tags.remove(instance)
-                    recipe.tags.add(existing_tag)
-
-                # Delete the old tag
-                instance.delete()
-
-                # Return the updated existing tag
-                return existing_tag
-        
-        # Update the current tag if no name conflict
-        instance.name = new_name
-        instance.save()
-        return instance
 
 class RecipeSerializer(serializers.ModelSerializer):
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    # Lists only ship the small variant, never the original
+    thumbnail = ImageVariantsField(variant='thumb', source='image_variants')
     class Meta:
         model = Recipe
         fields = [
             "id", "title", "time_minutes", "price", "link", 
-            "tags", "ingredients"
+            "tags", "ingredients", "thumbnail"
         ]
         read_only_fields = ["id"]
 
-    def _get_or_create_tags(self, tags, recipe):
+    def _get_or_create_tags(self, tags):
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user = auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
-
-    def _get_or_create_ingredients(self, ingredients, recipe):
+        return bulk_get_or_create(Tag, auth_user, [tag['name'] for tag in tags])
+
+    def _get_or_create_ingredients(self, ingredients):
         auth_user = self.context['request'].user
-        for ing in ingredients:
-            ing_obj, created = Ingredient.objects.get_or_create(
-                user = auth_user,
-                **ing,
-            )
-            recipe.ingredients.add(ing_obj)
+        return bulk_get_or_create(
+            Ingredient, auth_user, [ing['name'] for ing in ingredients],
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop("tags", [])
         ingredients = validated_data.pop("ingredients", [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags=tags, recipe=recipe)
-        self._get_or_create_ingredients(ingredients=ingredients, recipe=recipe)
+        recipe.tags.add(*self._get_or_create_tags(tags))
+        recipe.ingredients.add(*self._get_or_create_ingredients(ingredients))
         
         return recipe
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop("tags", None)
         ingredients = validated_data.pop("ingredients", None)
+        # set() only removes/adds the difference, so re-sending unchanged
+        # tags/ingredients leaves the through tables untouched.
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags=tags, recipe=instance)
+            instance.tags.set(self._get_or_create_tags(tags))
         
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients=ingredients, recipe=instance)
+            instance.ingredients.set(self._get_or_create_ingredients(ingredients))
 
         for attr, val in validated_data.items():
             setattr(instance, attr, val)
@@ -133,13 +170,38 @@ class RecipeSerializer(serializers.ModelSerializer):
 class RecipeDetailSerializer(RecipeSerializer):
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image', 'image_variants', 'image_status',
+        ]
+        # Images only change through upload-image or chunked uploads, which
+        # go through recipe.images.store_image
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + [
+            'image', 'image_status',
+        ]
+
+    image_variants = ImageVariantsField()
 
     
 class RecipeImageSerializer(serializers.ModelSerializer):
-    
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants', 'image_status']
         read_only_fields = ['id']
         extra_kwargs = {'image':{'required':'True'}}
+
+
+class ImageUploadSerializer(serializers.ModelSerializer):
+    """A chunked image upload (recipe.uploads) and how far it has got"""
+
+    class Meta:
+        model = ImageUpload
+        fields = ['id', 'filename', 'size', 'offset', 'expires_at']
+        read_only_fields = ['id', 'offset', 'expires_at']
+
+    def validate_size(self, value):
+        limit = settings.RECIPE_IMAGE_UPLOAD_MAX_SIZE
+        if not 0 < value <= limit:
+            raise serializers.ValidationError(f'Must be between 1 and {limit} bytes.')
+        return value
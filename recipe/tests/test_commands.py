@@ -0,0 +1,205 @@
+"""
+Tests for the recipe management commands
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.files.base import ContentFile
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from PIL import Image
+
+from core.models import ImageJob, ImageUpload, Recipe
+from recipe import images, uploads
+from recipe.management.commands.run_image_worker import Command
+
+
+class ImportRecipesCommandTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com",
+            "testpass@123",
+        )
+
+    def _write(self, suffix, content):
+        import_file = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        import_file.write(content.encode())
+        import_file.close()
+        self.addCleanup(os.remove, import_file.name)
+        return import_file.name
+
+    def test_import_recipes_in_batches(self):
+        path = self._write('.ndjson', ''.join(
+            f'{{"title": "r{i}", "time_minutes": 1, "price": "1.00", '
+            f'"tags": ["quick"]}}\n'
+            for i in range(5)
+        ))
+        out = StringIO()
+
+        call_command(
+            'import_recipes', path, user=self.user.email, batch_size=2, stdout=out,
+        )
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+        self.assertEqual(
+            Recipe.objects.filter(user=self.user, tags__name='quick').count(), 5,
+        )
+        output = out.getvalue()
+        self.assertIn('Imported 5 of 5 rows', output)
+        self.assertIn('rows/s', output)
+        # one progress line per batch
+        self.assertEqual(output.count('rows read'), 3)
+
+    def test_import_recipes_reports_errors(self):
+        path = self._write('.csv', 'title,time_minutes,price\nok,1,1.00\nbad,1,\n')
+        err = StringIO()
+
+        call_command(
+            'import_recipes', path, user=self.user.email, stdout=StringIO(), stderr=err,
+        )
+
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 1)
+        self.assertIn('row 3', err.getvalue())
+
+    def test_import_recipes_unknown_user(self):
+        path = self._write('.ndjson', '')
+
+        with self.assertRaises(CommandError):
+            call_command('import_recipes', path, user='nobody@example.com')
+
+
+class ImageWorkerTestMixin:
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            "user@example.com",
+            "testpass@123",
+        )
+        self.recipe = Recipe.objects.create(
+            user=user, title='Sample', time_minutes=5, price='1.00',
+        )
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        images.delete_variants(self.recipe.image_variants)
+        self.recipe.image.delete()
+
+    def attach(self, content):
+        self.recipe.image.save('photo.jpg', ContentFile(content))
+        images.queue_variants(self.recipe)
+
+    def jpeg(self):
+        buffer = BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    def run_worker(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command('run_image_worker', once=True, stdout=out, stderr=err, **options)
+        return out.getvalue()
+
+
+class RunImageWorkerPoolTests(ImageWorkerTestMixin, TransactionTestCase):
+    """The pool closes DB connections before forking, so no TestCase transaction"""
+
+    def test_process_pool_renders_variants(self):
+        self.attach(self.jpeg())
+
+        out = self.run_worker(workers=1)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(set(self.recipe.image_variants), set(images.VARIANTS))
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.STATUS_DONE)
+        self.assertIn('Processed 1 images', out)
+
+
+class RunImageWorkerCommandTests(ImageWorkerTestMixin, TestCase):
+
+    def test_results_in_completion_order(self):
+        jobs = [SimpleNamespace(image_name='slow.jpg'), SimpleNamespace(image_name='fast.jpg')]
+
+        def render_variants(image_name):
+            if image_name == 'slow.jpg':
+                time.sleep(0.2)
+            return {}
+
+        with patch('recipe.images.render_variants', render_variants), \
+                ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(Command().render(executor, jobs))
+
+        self.assertEqual([job.image_name for job, _ in results], ['fast.jpg', 'slow.jpg'])
+
+    def test_broken_image_fails_after_retries(self):
+        self.attach(b'not an image')
+
+        self.run_worker(workers=0, max_attempts=2)
+
+        job = ImageJob.objects.get()
+        self.assertEqual(job.status, ImageJob.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+
+    def test_stale_job_discards_variants(self):
+        self.attach(self.jpeg())
+        job = images.claim_jobs(1)[0]
+        variants = images.render_variants(job.image_name)
+        old_image = self.recipe.image.name
+        self.attach(self.jpeg())
+
+        images.finish_job(job, variants)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, {})
+        self.assertFalse(any(images.get_storage().exists(n) for n in variants.values()))
+        images.get_storage().delete(old_image)
+
+    def test_stalled_jobs_requeued(self):
+        self.attach(self.jpeg())
+        images.claim_jobs(1)
+        ImageJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+
+        self.run_worker(workers=0)
+
+        self.assertEqual(ImageJob.objects.get().status, ImageJob.STATUS_DONE)
+
+
+class PurgeUploadsCommandTests(TestCase):
+
+    def setUp(self):
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        upload_settings = self.settings(RECIPE_IMAGE_UPLOAD_DIR=upload_dir.name)
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+        user = get_user_model().objects.create_user("user@example.com", "testpass@123")
+        self.recipe = Recipe.objects.create(
+            user=user, title='r', time_minutes=1, price='1.00',
+        )
+
+    def test_purge_expired_uploads(self):
+        expired = uploads.start(self.recipe, 'old.jpg', 10)
+        ImageUpload.objects.filter(pk=expired.pk).update(
+            expires_at=timezone.now() - timedelta(minutes=1),
+        )
+        active = uploads.start(self.recipe, 'new.jpg', 10)
+        out = StringIO()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_uploads', stdout=out)
+
+        self.assertIn('Deleted 1 expired uploads', out.getvalue())
+        self.assertEqual(list(ImageUpload.objects.all()), [active])
+        self.assertFalse(os.path.exists(uploads.upload_path(expired)))
+        self.assertTrue(os.path.exists(uploads.upload_path(active)))
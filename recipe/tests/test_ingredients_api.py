@@ -1,4 +1,5 @@
 from django.contrib.auth import get_user_model
+from decimal import Decimal
 from core.models import Ingredient, Recipe
 from recipe.serializers import IngredientSerializer
 from django.test import TestCase
@@ -47,8 +48,8 @@ class PrivateIngredientsApiTests(TestCase):
         serializer2 = IngredientSerializer(ingredients2, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(serializer.data, res.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertEqual(serializer.data, res.data['results'])
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_update_ingredient(self):
         ingredient = Ingredient.objects.create(name="ingredient", user=self.user)
@@ -61,6 +62,23 @@ class PrivateIngredientsApiTests(TestCase):
         ingredient.refresh_from_db()
         self.assertEqual(ingredient.name, payload["name"])
 
+    def test_update_ingredient_name_to_existing_name(self):
+        salt = Ingredient.objects.create(user=self.user, name='salt')
+        sea_salt = Ingredient.objects.create(user=self.user, name='sea salt')
+        recipe = Recipe.objects.create(
+            title='Chips',
+            time_minutes=20,
+            price=Decimal('2.00'),
+            user=self.user,
+        )
+        recipe.ingredients.add(salt)
+
+        res = self.client.patch(detail_url(salt.id), {'name': 'sea salt'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Ingredient.objects.filter(id=salt.id).exists())
+        self.assertEqual(list(recipe.ingredients.all()), [sea_salt])
+
     def test_delete_ingredient_and_of_user_only(self):
         user2 = create_user(email="user2@example.com")
         ing1 = Ingredient.objects.create(name="salt", user=self.user)
@@ -73,3 +91,21 @@ class PrivateIngredientsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Ingredient.objects.all().count(), 2)
 
+
+    def test_filter_ingredients_assigned_to_recipes(self):
+        in1 = Ingredient.objects.create(user=self.user, name='Apples')
+        in2 = Ingredient.objects.create(user=self.user, name='Turkey')
+        recipe = Recipe.objects.create(
+            title='Apple Crumble',
+            time_minutes=5,
+            price=Decimal('4.50'),
+            user=self.user,
+        )
+        recipe.ingredients.add(in1)
+
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        s1 = IngredientSerializer(in1)
+        s2 = IngredientSerializer(in2)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
@@ -1,18 +1,33 @@
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import RecipeViewSet
 from decimal import Decimal
-from core.models import Recipe, Tag, Ingredient
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from core.models import ImageBlob, ImageJob, ImageUpload, Recipe, Tag, Ingredient
+from recipe import images, uploads
 
+import csv
+import fcntl
+import io
+import json
 import tempfile
 import os
+from unittest.mock import patch
 from PIL import Image
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
+IMPORT_URL = reverse('recipe:recipe-import')
 
 def detail_url(recipe_id):
     return reverse('recipe:recipe-detail', args=[recipe_id])
@@ -31,6 +46,29 @@ def create_recipe(user, **params):
     defaults.update(params)
     return Recipe.objects.create(user=user, **defaults)
 
+def create_recipe_with_attrs(user, **params):
+    """Create a recipe with one tag and one ingredient attached"""
+    recipe = create_recipe(user, **params)
+    recipe.tags.add(Tag.objects.create(user=user, name=f"tag{recipe.id}"))
+    recipe.ingredients.add(
+        Ingredient.objects.create(user=user, name=f"ingredient{recipe.id}")
+    )
+    return recipe
+
+def assert_constant_query_count(testcase, url, add_rows, sizes=(1, 5)):
+    """
+    Assert GET url runs the same number of queries whatever the result size.
+    add_rows(n) is called before each request to grow the result set by n.
+    """
+    counts = []
+    for size in sizes:
+        add_rows(size)
+        with CaptureQueriesContext(connection) as queries:
+            res = testcase.client.get(url)
+        testcase.assertEqual(res.status_code, status.HTTP_200_OK)
+        counts.append(len(queries))
+    testcase.assertEqual(len(set(counts)), 1, f"query counts grew: {counts}")
+
 class PublicRecipeAPITests(TestCase):
     """Test unauthetnticated API test"""
     def setUp(self):
@@ -60,7 +98,7 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.all().order_by('-id')
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_retrive_recipes_of_user_for_user(self):
         
@@ -76,7 +114,22 @@ class PrivateRecipeAPITests(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializer(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_list_recipes_paginated_by_cursor(self):
+        """Recipes are paged newest first and the cursor walks every row once"""
+        recipes = [create_recipe(user=self.user) for _ in range(5)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+
+        ids = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [r['id'] for r in res.data['results']]
+
+        self.assertEqual(ids, [r.id for r in reversed(recipes)])
 
     def test_get_recipe_detail(self):
 
@@ -88,6 +141,27 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.data, serializer.data)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def test_list_recipes_query_count_constant(self):
+        """Listing recipes does not issue per-recipe tag/ingredient queries"""
+        def add_rows(n):
+            for _ in range(n):
+                create_recipe_with_attrs(user=self.user)
+
+        assert_constant_query_count(self, RECIPES_URL, add_rows)
+
+    def test_get_recipe_detail_query_count_constant(self):
+        """Recipe detail cost does not depend on its tags/ingredients count"""
+        recipe = create_recipe(user=self.user)
+
+        def add_rows(n):
+            for i in range(n):
+                recipe.tags.add(Tag.objects.create(user=self.user, name=f"t{i}{n}"))
+                recipe.ingredients.add(
+                    Ingredient.objects.create(user=self.user, name=f"i{i}{n}")
+                )
+
+        assert_constant_query_count(self, detail_url(recipe.id), add_rows)
+
     def test_create_recipe(self):
         payload = {
             "title":"sample recipe title",
@@ -247,6 +321,46 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(recipe.tags.count(), 1)
         self.assertIn(tag_italian, recipe.tags.all())
 
+    def test_update_recipe_unchanged_attrs_no_through_writes(self):
+        """Re-sending the same tags/ingredients doesn't rewrite the links"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name="Indian"))
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name="rice"))
+        payload = {
+            'title': 'autosaved title',
+            'tags': [{'name': 'Indian'}],
+            'ingredients': [{'name': 'rice'}],
+        }
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        through_writes = [
+            q['sql'] for q in queries
+            if q['sql'].startswith(('INSERT', 'DELETE'))
+            and ('"core_recipe_tags"' in q['sql']
+                 or '"core_recipe_ingredients"' in q['sql'])
+        ]
+        self.assertEqual(through_writes, [])
+
+    def test_update_recipe_tags_only_changes_difference(self):
+        recipe = create_recipe(user=self.user)
+        keep = Tag.objects.create(user=self.user, name="keep")
+        drop = Tag.objects.create(user=self.user, name="drop")
+        recipe.tags.add(keep, drop)
+        link = Recipe.tags.through.objects.get(recipe=recipe, tag=keep)
+
+        payload = {'tags': [{'name': 'keep'}, {'name': 'new'}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(
+            recipe.tags.values_list('name', flat=True), ['keep', 'new'],
+        )
+        # the surviving link row was not deleted and re-inserted
+        self.assertTrue(Recipe.tags.through.objects.filter(id=link.id).exists())
+
     def test_clear_recipe_tags(self):
         tag = Tag.objects.create(user=self.user, name="sweet")
         recipe = create_recipe(user=self.user)
@@ -292,6 +406,41 @@ class PrivateRecipeAPITests(TestCase):
                 ).exists()
             )
     
+    def test_create_recipe_nested_attrs_query_count_constant(self):
+        """Nested tags/ingredients are resolved with set-based queries"""
+        Tag.objects.create(user=self.user, name="existing")
+        counts = []
+        for size in (2, 20):
+            payload = {
+                "title":"stew",
+                "time_minutes":60,
+                "price":Decimal("8.00"),
+                "tags":[{"name":"existing"}] + [
+                    {"name":f"tag{size}-{i}"} for i in range(size)
+                ],
+                "ingredients":[{"name":f"ing{size}-{i}"} for i in range(size)],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(RECIPES_URL, payload, format="json")
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(res.data['ingredients']), size)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Tag.objects.filter(name="existing").count(), 1)
+
+    def test_create_recipe_duplicate_nested_names(self):
+        payload = {
+            "title":"salad",
+            "time_minutes":5,
+            "price":Decimal("3.00"),
+            "ingredients":[{"name":"leaf"}, {"name":"leaf"}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 1)
+
     def test_create_or_assign_ingredients_on_recipe_update(self):
         ing = Ingredient.objects.create(name="soda", user=self.user)
         recipe = create_recipe(user=self.user)
@@ -322,6 +471,597 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_filter_by_tags(self):
+        r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
+        r2 = create_recipe(user=self.user, title='Aubergine with Tahini')
+        r3 = create_recipe(user=self.user, title='Fish and chips')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Vegetarian')
+        r1.tags.add(tag1)
+        r2.tags.add(tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(ids, [r1.id, r2.id])
+        self.assertNotIn(r3.id, ids)
+
+    def test_filter_by_tags_match_all(self):
+        r1 = create_recipe(user=self.user, title='Vegan curry')
+        r2 = create_recipe(user=self.user, title='Curry')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Spicy')
+        r1.tags.add(tag1, tag2)
+        r2.tags.add(tag2)
+
+        res = self.client.get(
+            RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'},
+        )
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r1.id])
+
+    def test_filter_by_ingredients(self):
+        r1 = create_recipe(user=self.user, title='Posh Beans on Toast')
+        r2 = create_recipe(user=self.user, title='Chicken Cacciatore')
+        r3 = create_recipe(user=self.user, title='Red Lentil Daal')
+        in1 = Ingredient.objects.create(user=self.user, name='Feta Cheese')
+        in2 = Ingredient.objects.create(user=self.user, name='Chicken')
+        r1.ingredients.add(in1)
+        r2.ingredients.add(in2)
+        r3.ingredients.add(in1, in2)
+
+        res = self.client.get(RECIPES_URL, {'ingredients': f'{in1.id}'})
+        ids = [r['id'] for r in res.data['results']]
+        self.assertCountEqual(ids, [r1.id, r3.id])
+
+        res = self.client.get(
+            RECIPES_URL, {'ingredients': f'{in1.id},{in2.id}', 'match': 'all'},
+        )
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r3.id])
+
+    def test_filter_unknown_match_rejected(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag.id}', 'match': 'al'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('match', res.data)
+
+    def test_filter_by_tags_and_ingredients_single_query(self):
+        """Both filters resolve inside the one recipe SELECT"""
+        recipe = create_recipe_with_attrs(user=self.user)
+        tag = recipe.tags.get()
+        ing = recipe.ingredients.get()
+        params = {'tags': f'{tag.id}', 'ingredients': f'{ing.id}'}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe.id])
+        recipe_selects = [
+            q for q in queries
+            if q['sql'].startswith('SELECT "core_recipe"."id"')
+        ]
+        self.assertEqual(len(recipe_selects), 1)
+
+    def test_filter_invalid_ids(self):
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('tags', res.data)
+
+    def test_search_recipes(self):
+        r1 = create_recipe(user=self.user, title='Lemon drizzle cake',
+                           description='A sharp citrus sponge')
+        r2 = create_recipe(user=self.user, title='Roast chicken',
+                           description='Stuff it with a lemon')
+        create_recipe(user=self.user, title='Porridge', description='Oats')
+        other = get_user_model().objects.create_user(
+            "other@example.com",
+            "testpass@123",
+        )
+        create_recipe(user=other, title='Lemon tart')
+
+        res = self.client.get(RECIPES_URL, {'search': 'lemons'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        # title matches outrank description matches
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id, r2.id])
+
+    def test_search_recipes_by_tag_and_ingredient_names(self):
+        recipe = create_recipe(user=self.user, title='Dal')
+        create_recipe(user=self.user, title='Toast')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Lentils'),
+        )
+
+        for term in ('vegan', 'lentil', 'vegan lentils'):
+            res = self.client.get(RECIPES_URL, {'search': term})
+            self.assertEqual(
+                [r['id'] for r in res.data['results']], [recipe.id], term,
+            )
+
+    def test_search_follows_tag_rename_and_delete(self):
+        recipe = create_recipe(user=self.user, title='Dal')
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipe.tags.add(tag)
+
+        tag.name = 'Spicy'
+        tag.save()
+        res = self.client.get(RECIPES_URL, {'search': 'spicy'})
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe.id])
+
+        tag.delete()
+        res = self.client.get(RECIPES_URL, {'search': 'spicy'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_search_results_paginated_by_rank(self):
+        title_hits = [create_recipe(user=self.user, title='Mango lassi')
+                      for _ in range(2)]
+        desc_hits = [create_recipe(user=self.user, title='Smoothie',
+                                   description='mango') for _ in range(2)]
+
+        res = self.client.get(RECIPES_URL, {'search': 'mango', 'page_size': 1})
+        ids = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids += [r['id'] for r in res.data['results']]
+
+        self.assertCountEqual(ids[:2], [r.id for r in title_hits])
+        self.assertCountEqual(ids[2:], [r.id for r in desc_hits])
+
+    def test_bulk_create_recipes(self):
+        Tag.objects.create(user=self.user, name="Dinner")
+        payload = [
+            {"title":"Curry", "time_minutes":30, "price":"5.00",
+             "tags":[{"name":"Dinner"}, {"name":"Spicy"}],
+             "ingredients":[{"name":"Rice"}]},
+            {"title":"Missing price", "time_minutes":5},
+            {"title":"Soup", "time_minutes":20, "price":"3.00",
+             "description":"warm", "tags":[{"name":"Dinner"}]},
+        ]
+
+        res = self.client.post(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['index'] for r in res.data['results']], [0, 2])
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertIn('price', res.data['errors'][0]['errors'])
+        curry = Recipe.objects.get(id=res.data['results'][0]['id'])
+        self.assertEqual(curry.user, self.user)
+        self.assertCountEqual(
+            curry.tags.values_list('name', flat=True), ["Dinner", "Spicy"],
+        )
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        soup = Recipe.objects.get(id=res.data['results'][1]['id'])
+        self.assertEqual(soup.description, "warm")
+        res = self.client.get(RECIPES_URL, {'search': 'rice'})
+        self.assertEqual([r['id'] for r in res.data['results']], [curry.id])
+
+    def test_bulk_create_query_count_constant(self):
+        counts = []
+        for size in (2, 20):
+            payload = [
+                {"title":f"r{i}", "time_minutes":1, "price":"1.00",
+                 "tags":[{"name":f"t{size}-{i}"}],
+                 "ingredients":[{"name":f"salt{size}"}]}
+                for i in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.post(BULK_URL, payload, format="json")
+            self.assertEqual(len(res.data['results']), size)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_update_recipes(self):
+        r1 = create_recipe(user=self.user, title="old 1")
+        r2 = create_recipe(user=self.user, title="old 2")
+        keep = Tag.objects.create(user=self.user, name="keep")
+        drop = Tag.objects.create(user=self.user, name="drop")
+        r2.tags.add(keep, drop)
+        other = create_recipe(
+            user=get_user_model().objects.create_user("o@example.com", "pass@123"),
+        )
+        payload = [
+            {"id":r1.id, "title":"new 1"},
+            {"id":r2.id, "price":"1.25", "tags":[{"name":"keep"}, {"name":"add"}]},
+            {"id":other.id, "title":"hijack"},
+            {"id":r1.id, "title":"again"},
+            {"id":r1.id + 1000, "title":"missing"},
+            {"title":"no id"},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['results'],
+            [{'index': 0, 'id': r1.id}, {'index': 1, 'id': r2.id}],
+        )
+        self.assertEqual([e['index'] for e in res.data['errors']], [2, 3, 4, 5])
+        r1.refresh_from_db()
+        r2.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(r1.title, "new 1")
+        self.assertEqual(r2.title, "old 2")
+        self.assertEqual(r2.price, Decimal("1.25"))
+        self.assertCountEqual(r2.tags.values_list('name', flat=True), ["keep", "add"])
+        self.assertNotEqual(other.title, "hijack")
+
+    def test_bulk_delete_recipes(self):
+        r1 = create_recipe(user=self.user)
+        r2 = create_recipe(user=self.user)
+        other = create_recipe(
+            user=get_user_model().objects.create_user("o@example.com", "pass@123"),
+        )
+
+        res = self.client.delete(BULK_URL, [r1.id, other.id], format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'index': 0, 'id': r1.id}])
+        self.assertEqual(res.data['errors'][0]['index'], 1)
+        self.assertFalse(Recipe.objects.filter(id=r1.id).exists())
+        self.assertEqual(Recipe.objects.filter(id__in=[r2.id, other.id]).count(), 2)
+
+    def test_bulk_delete_duplicate_ids(self):
+        recipe = create_recipe(user=self.user)
+
+        res = self.client.delete(BULK_URL, [recipe.id, recipe.id], format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'index': 0, 'id': recipe.id}])
+        self.assertEqual(res.data['errors'], [
+            {'index': 1, 'errors': {'id': ['Duplicate id.']}},
+        ])
+        self.assertFalse(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_bulk_rejects_non_list(self):
+        res = self.client.post(BULK_URL, {"title":"x"}, format="json")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_recipes_ndjson(self):
+        r1 = create_recipe_with_attrs(user=self.user, title="First")
+        r2 = create_recipe(user=self.user, title="Second")
+        create_recipe(
+            user=get_user_model().objects.create_user("o@example.com", "pass@123"),
+        )
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.streaming)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(res.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], [r1.id, r2.id])
+        self.assertEqual(rows[0]['tags'], [f"tag{r1.id}"])
+        self.assertEqual(rows[0]['ingredients'], [f"ingredient{r1.id}"])
+        self.assertEqual(rows[1]['price'], "10.50")
+
+    def test_export_recipes_csv(self):
+        recipe = create_recipe(user=self.user, title="Tacos, fish")
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name="Mexican"),
+            Tag.objects.create(user=self.user, name="Dinner"),
+        )
+
+        res = self.client.get(EXPORT_URL, {'output': 'csv'})
+
+        self.assertEqual(res['Content-Type'], 'text/csv')
+        content = b''.join(res.streaming_content).decode()
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], "Tacos, fish")
+        self.assertCountEqual(rows[0]['tags'].split(';'), ["Mexican", "Dinner"])
+
+    def test_export_queries_per_chunk_not_per_recipe(self):
+        for _ in range(6):
+            create_recipe_with_attrs(user=self.user)
+
+        with patch.object(RecipeViewSet, 'export_chunk_size', 3):
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(EXPORT_URL)
+                rows = b''.join(res.streaming_content).splitlines()
+
+        self.assertEqual(len(rows), 6)
+        # one recipe cursor plus a tags and an ingredients query per chunk
+        prefetches = [q for q in queries if 'core_recipe_tags' in q['sql']]
+        self.assertEqual(len(prefetches), 2)
+
+    def test_export_rejects_unknown_output(self):
+        res = self.client.get(EXPORT_URL, {'output': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_exported_ndjson(self):
+        """An export imports back into another account unchanged"""
+        create_recipe_with_attrs(user=self.user, title="Pie")
+        create_recipe(user=self.user, title="Tart")
+        exported = b''.join(self.client.get(EXPORT_URL).streaming_content)
+        other = get_user_model().objects.create_user("o@example.com", "pass@123")
+        self.client.force_authenticate(other)
+
+        upload = SimpleUploadedFile("recipes.ndjson", exported)
+        res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(res.data['errors'], [])
+        pie = Recipe.objects.get(user=other, title="Pie")
+        self.assertEqual(pie.tags.get().user, other)
+        self.assertEqual(pie.ingredients.count(), 1)
+
+    def test_import_exported_csv_with_separator_in_name(self):
+        recipe = create_recipe(user=self.user, title="Chips")
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name="Salt; vinegar"),
+            Tag.objects.create(user=self.user, name="Back\\slash"),
+        )
+        exported = b''.join(
+            self.client.get(EXPORT_URL, {'output': 'csv'}).streaming_content,
+        )
+        other = get_user_model().objects.create_user("o@example.com", "pass@123")
+        self.client.force_authenticate(other)
+
+        upload = SimpleUploadedFile("recipes.csv", exported)
+        res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.data['created'], 1)
+        chips = Recipe.objects.get(user=other, title="Chips")
+        self.assertCountEqual(
+            chips.tags.values_list('name', flat=True), ["Salt; vinegar", "Back\\slash"],
+        )
+
+    def test_import_csv_reports_row_errors(self):
+        content = (
+            "title,time_minutes,price,tags\n"
+            "Soup,10,2.50,Starter;Hot\n"
+            "Bad,ten,2.50,\n"
+            "Salad,5,1.00,Starter\n"
+        ).encode()
+        upload = SimpleUploadedFile("recipes.csv", content)
+
+        with patch.object(RecipeViewSet, 'import_batch_size', 2):
+            res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.data['rows'], 3)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual(res.data['error_count'], 1)
+        self.assertEqual(res.data['errors'][0]['row'], 3)
+        self.assertIn('time_minutes', res.data['errors'][0]['errors'])
+        self.assertEqual(Tag.objects.filter(user=self.user, name="Starter").count(), 1)
+        self.assertIn('rows_per_second', res.data)
+
+    def test_import_ndjson_bad_line(self):
+        upload = SimpleUploadedFile(
+            "recipes.ndjson",
+            b'{"title": "Ok", "time_minutes": 1, "price": "1.00"}\nnot json\n',
+        )
+
+        res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['errors'][0]['row'], 2)
+
+    def test_import_ndjson_not_utf8(self):
+        upload = SimpleUploadedFile(
+            "recipes.ndjson",
+            b'{"title": "Ok", "time_minutes": 1, "price": "1.00"}\n\xff\xfe\n',
+        )
+
+        res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['error_count'], 1)
+        self.assertEqual(res.data['errors'][0]['row'], 2)
+
+    def test_import_csv_malformed_row(self):
+        too_long = 'x' * (csv.field_size_limit() + 1)
+        content = (
+            "title,time_minutes,price\n"
+            f"{too_long},1,1.00\n"
+            "Soup,10,2.50\n"
+        ).encode()
+        upload = SimpleUploadedFile("recipes.csv", content)
+
+        res = self.client.post(IMPORT_URL, {'file': upload}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual(res.data['error_count'], 1)
+        self.assertEqual(res.data['errors'][0]['row'], 2)
+
+    def test_import_requires_file(self):
+        res = self.client.post(IMPORT_URL, {}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+class RecipeListCacheTests(TestCase):
+    """Test list responses are cached per user until their data changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "cache@example.com",
+            "testpass@123",
+        )
+        self.client.force_authenticate(self.user)
+
+    def _get_list(self, url=RECIPES_URL, **params):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return json.loads(res.content), len(queries)
+
+    def test_repeated_list_served_from_cache(self):
+        create_recipe_with_attrs(user=self.user)
+
+        first, first_queries = self._get_list()
+        second, second_queries = self._get_list()
+
+        self.assertEqual(first, second)
+        self.assertGreater(first_queries, 0)
+        self.assertEqual(second_queries, 0)
+
+    def test_cached_list_keeps_headers(self):
+        first = self.client.get(RECIPES_URL)
+        second = self.client.get(RECIPES_URL)
+
+        for header in ('ETag', 'Vary', 'Allow', 'Content-Type'):
+            self.assertEqual(second[header], first[header])
+
+    def test_not_cached_without_shared_cache(self):
+        create_recipe(user=self.user)
+
+        with self.settings(RECIPE_CACHE_ALIAS=None):
+            self._get_list()
+            res = self.client.get(RECIPES_URL)
+            _, queries = self._get_list()
+
+        self.assertGreater(queries, 0)
+        self.assertFalse(res.has_header('ETag'))
+
+    def test_query_params_cached_separately(self):
+        create_recipe(user=self.user, title="Lemon cake")
+        create_recipe(user=self.user, title="Bread")
+
+        everything, _ = self._get_list()
+        searched, _ = self._get_list(search='lemon')
+
+        self.assertEqual(len(everything['results']), 2)
+        self.assertEqual(len(searched['results']), 1)
+
+    def test_cache_invalidated_by_writes(self):
+        recipe = create_recipe(user=self.user, title="Before")
+        self._get_list()
+
+        self.client.patch(detail_url(recipe.id), {'title': 'After'})
+        data, _ = self._get_list()
+        self.assertEqual(data['results'][0]['title'], 'After')
+
+        recipe.tags.add(Tag.objects.create(user=self.user, name="new"))
+        data, _ = self._get_list()
+        self.assertEqual(data['results'][0]['tags'][0]['name'], 'new')
+
+        self.client.post(BULK_URL, [
+            {"title":"Bulk", "time_minutes":1, "price":"1.00"},
+        ], format="json")
+        data, _ = self._get_list()
+        self.assertEqual(len(data['results']), 2)
+
+    def test_tag_list_invalidated_by_nested_create(self):
+        tags_url = reverse('recipe:tag-list')
+        data, _ = self._get_list(tags_url)
+        self.assertEqual(data['results'], [])
+
+        self.client.post(RECIPES_URL, {
+            "title":"Curry", "time_minutes":30, "price":"5.00",
+            "tags":[{"name":"Spicy"}],
+        }, format="json")
+        data, _ = self._get_list(tags_url)
+
+        self.assertEqual([t['name'] for t in data['results']], ['Spicy'])
+
+    def test_cache_isolated_between_users(self):
+        create_recipe(user=self.user)
+        self._get_list()
+        other = get_user_model().objects.create_user("o@example.com", "pass@123")
+        self.client.force_authenticate(other)
+
+        data, _ = self._get_list()
+
+        self.assertEqual(data['results'], [])
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag based conditional GET and optimistic concurrency"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "etag@example.com",
+            "testpass@123",
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def test_detail_not_modified(self):
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        self.assertEqual(len(queries), 1)
+
+    def test_detail_etag_changes_with_tags(self):
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name="new"))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.data['tags'][0]['name'], "new")
+
+    def test_detail_etag_changes_with_tag_rename(self):
+        tag = Tag.objects.create(user=self.user, name="old")
+        self.recipe.tags.add(tag)
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        tag.name = "renamed"
+        tag.save()
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_detail_etag_per_renderer(self):
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.get(url, HTTP_ACCEPT='text/html', HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertIn('Accept', res['Vary'])
+
+    def test_update_if_match(self):
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        res = self.client.patch(url, {'title': 'mine'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        new_etag = res['ETag']
+        self.assertNotEqual(new_etag, etag)
+        self.assertEqual(self.client.get(url)['ETag'], new_etag)
+
+        res = self.client.patch(url, {'title': 'stale'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'mine')
+
+    def test_list_not_modified_until_write(self):
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
 class ImageUploadTests(TestCase):
 
     def setUp(self):
@@ -334,8 +1074,160 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        images.delete_variants(self.recipe.image_variants)
         self.recipe.image.delete()
 
+    def upload(self, img, process=True, **save_kwargs):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            img.save(image_file, format='JPEG', **save_kwargs)
+            image_file.seek(0)
+            res = self.client.post(
+                image_upload_url(self.recipe.id), {'image': image_file}, format='multipart',
+            )
+        if process:
+            call_command('run_image_worker', once=True, workers=0, stdout=io.StringIO())
+        return res
+
+    def test_upload_image_queues_variants(self):
+        res = self.upload(Image.new('RGB', (10, 10)), process=False)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertEqual(res.data['image_variants'], {})
+        self.assertTrue(ImageJob.objects.filter(recipe=self.recipe).exists())
+
+    def test_upload_image_generates_variants(self):
+        self.upload(Image.new('RGB', (2000, 1000)))
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.assertEqual(set(res.data['image_variants']), set(images.VARIANTS))
+        self.recipe.refresh_from_db()
+        storage = images.get_storage()
+        for variant, size in images.VARIANTS.items():
+            with storage.open(self.recipe.image_variants[variant]) as variant_file:
+                with Image.open(variant_file) as img:
+                    self.assertEqual(img.format, 'WEBP')
+                    self.assertEqual(img.size, (size, size // 2))
+
+    def test_variants_strip_exif_and_apply_orientation(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees
+        exif[0x010F] = 'Camera maker'
+        self.upload(Image.new('RGB', (40, 20)), exif=exif)
+
+        self.recipe.refresh_from_db()
+        with images.get_storage().open(self.recipe.image_variants['thumb']) as variant_file:
+            with Image.open(variant_file) as img:
+                self.assertEqual(img.size, (20, 40))
+                self.assertEqual(dict(img.getexif()), {})
+
+    def test_list_ships_thumbnail_only(self):
+        self.upload(Image.new('RGB', (10, 10)))
+
+        res = self.client.get(RECIPES_URL)
+
+        recipe = res.data['results'][0]
+        self.assertTrue(recipe['thumbnail'].endswith('_thumb.webp'))
+        self.assertNotIn('image', recipe)
+        self.assertNotIn('image_variants', recipe)
+
+    def test_replacing_image_removes_old_files(self):
+        self.upload(Image.new('RGB', (10, 10), 'red'))
+        self.recipe.refresh_from_db()
+        old_image, old_variants = self.recipe.image.name, self.recipe.image_variants
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload(Image.new('RGB', (10, 10), 'blue'))
+
+        storage = images.get_storage()
+        self.assertFalse(storage.exists(old_image))
+        self.assertFalse(any(storage.exists(name) for name in old_variants.values()))
+        self.assertFalse(ImageBlob.objects.filter(name=old_image).exists())
+
+    def test_recipe_update_cannot_replace_image(self):
+        self.upload(Image.new('RGB', (10, 10), 'red'))
+        self.recipe.refresh_from_db()
+        image, variants = self.recipe.image.name, self.recipe.image_variants
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10), 'blue').save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.patch(
+                detail_url(self.recipe.id),
+                {'image': image_file, 'image_status': Recipe.IMAGE_FAILED},
+                format='multipart',
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, image)
+        self.assertEqual(self.recipe.image_variants, variants)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+    def test_same_image_stored_once(self):
+        other = create_recipe(self.user)
+        self.upload(Image.new('RGB', (10, 10), 'green'))
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10), 'green').save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(
+                image_upload_url(other.id), {'image': image_file}, format='multipart',
+            )
+
+        self.recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        # Variants rendered for the first upload are reused
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_READY)
+        self.assertEqual(other.image_variants, self.recipe.image_variants)
+        self.assertEqual(ImageJob.objects.filter(recipe=other).count(), 0)
+
+    def test_deleting_recipes_collects_unused_image(self):
+        other = create_recipe(self.user)
+        self.upload(Image.new('RGB', (10, 10), 'white'))
+        self.recipe.refresh_from_db()
+        images.store_image(other, SimpleUploadedFile(
+            'copy.jpg', self.recipe.image.read(), content_type='image/jpeg',
+        ))
+        name, variants = self.recipe.image.name, self.recipe.image_variants.values()
+        storage = images.get_storage()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertTrue(storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Recipe.objects.filter(pk=self.recipe.pk).delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(any(storage.exists(variant) for variant in variants))
+        self.assertFalse(ImageBlob.objects.exists())
+        self.recipe = create_recipe(self.user)
+
+    def test_image_taken_again_before_collection_kept(self):
+        self.upload(Image.new('RGB', (10, 10), 'white'))
+        self.recipe.refresh_from_db()
+        content = self.recipe.image.read()
+        name = self.recipe.image.name
+        other = create_recipe(self.user)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Recipe.objects.filter(pk=self.recipe.pk).delete()
+        images.store_image(other, SimpleUploadedFile(
+            'copy.jpg', content, content_type='image/jpeg',
+        ))
+        for callback in callbacks:
+            callback()
+
+        self.assertTrue(images.get_storage().exists(name))
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.recipe = other
+
     def test_upload_image(self):
         url = image_upload_url(self.recipe.id)
         with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
@@ -368,4 +1260,157 @@ class ImageUploadTests(TestCase):
         self.assertTrue('valid image' in res.data['image'][0])
 
         # Clean up temporary file
-        os.remove(temp_file.name)
\ No newline at end of file
+        os.remove(temp_file.name)
+
+def start_upload_url(recipe_id):
+    return reverse('recipe:recipe-start-upload', args=[recipe_id])
+
+def upload_chunk_url(recipe_id, upload_id):
+    return reverse('recipe:recipe-upload-chunk', args=[recipe_id, upload_id])
+
+def complete_upload_url(recipe_id, upload_id):
+    return reverse('recipe:recipe-complete-upload', args=[recipe_id, upload_id])
+
+
+class ChunkedImageUploadTests(TestCase):
+
+    def setUp(self):
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        upload_settings = self.settings(RECIPE_IMAGE_UPLOAD_DIR=upload_dir.name)
+        upload_settings.enable()
+        self.addCleanup(upload_settings.disable)
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+        buffer = io.BytesIO()
+        Image.effect_noise((200, 200), 64).save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            self.recipe.image.delete()
+
+    def start(self, size=None):
+        res = self.client.post(
+            start_upload_url(self.recipe.id),
+            {'filename': 'photo.png', 'size': size or len(self.content)},
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def send(self, upload_id, chunk, offset):
+        return self.client.patch(
+            upload_chunk_url(self.recipe.id, upload_id), chunk,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunked_upload_attaches_image(self):
+        upload_id = self.start()
+        path = uploads.upload_path(ImageUpload.objects.get(pk=upload_id))
+        third = len(self.content) // 3
+        for offset in range(0, len(self.content), third):
+            res = self.send(upload_id, self.content[offset:offset + third], offset)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['offset'], len(self.content))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(complete_upload_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_status'], Recipe.IMAGE_PENDING)
+        self.recipe.refresh_from_db()
+        with self.recipe.image.open('rb') as image_file:
+            self.assertEqual(image_file.read(), self.content)
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_extension_from_detected_format(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (10, 10)).save(buffer, format='GIF')
+        self.content = buffer.getvalue()
+        upload_id = self.client.post(
+            start_upload_url(self.recipe.id),
+            {'filename': 'evil.html', 'size': len(self.content)},
+        ).data['id']
+        self.send(upload_id, self.content, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(complete_upload_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image.name.endswith('.gif'))
+
+    def test_resume_from_reported_offset(self):
+        upload_id = self.start()
+        self.send(upload_id, self.content[:1000], 0)
+
+        res = self.send(upload_id, self.content[500:], 500)
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+
+        res = self.client.get(upload_chunk_url(self.recipe.id, upload_id))
+        self.assertEqual(res.data['offset'], 1000)
+        res = self.send(upload_id, self.content[1000:], 1000)
+        self.assertEqual(res.data['offset'], len(self.content))
+
+    def test_concurrent_chunk_rejected(self):
+        upload_id = self.start()
+        path = uploads.upload_path(ImageUpload.objects.get(pk=upload_id))
+
+        with open(path, 'r+b') as temp_file:
+            fcntl.flock(temp_file, fcntl.LOCK_EX)
+            res = self.send(upload_id, self.content[:1000], 0)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(ImageUpload.objects.get(pk=upload_id).offset, 0)
+
+    def test_non_image_rejected_before_body_complete(self):
+        upload_id = self.start(size=uploads.HEADER_BYTES * 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.send(upload_id, b'not an image'.ljust(uploads.HEADER_BYTES), 0)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(ImageUpload.objects.exists())
+
+    def test_chunk_past_announced_size(self):
+        upload_id = self.start(size=100)
+
+        res = self.send(upload_id, self.content[:101], 0)
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_size_limit(self):
+        with self.settings(RECIPE_IMAGE_UPLOAD_MAX_SIZE=100):
+            res = self.client.post(
+                start_upload_url(self.recipe.id), {'filename': 'photo.png', 'size': 101},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_complete_requires_every_byte(self):
+        upload_id = self.start()
+        self.send(upload_id, self.content[:1000], 0)
+
+        res = self.client.post(complete_upload_url(self.recipe.id, upload_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    def test_other_users_recipe(self):
+        other = get_user_model().objects.create_user('other@example.com', 'password123')
+        recipe = create_recipe(other)
+
+        res = self.client.post(
+            start_upload_url(recipe.id), {'filename': 'photo.png', 'size': 10},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
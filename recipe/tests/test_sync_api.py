@@ -0,0 +1,134 @@
+"""
+Tests for the delta sync API
+"""
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient, Tombstone
+from recipe.views import SyncView
+
+SYNC_URL = reverse('recipe:sync')
+
+
+def create_recipe(user, **params):
+    defaults = {
+        "title":"sample recipe title",
+        "time_minutes":5,
+        "price":Decimal("10.50"),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class PublicSyncApiTests(TestCase):
+
+    def test_auth_required(self):
+        res = APIClient().get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@patch.object(SyncView, 'overlap', timedelta(0))
+class PrivateSyncApiTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            "user@example.com",
+            "testpass@123",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_full_sync_without_token(self):
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="Dinner")
+        other = get_user_model().objects.create_user("o@example.com", "pass@123")
+        create_recipe(user=other)
+
+        res = self.client.get(SYNC_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res.data['full'])
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual([t['id'] for t in res.data['tags']], [tag.id])
+        self.assertTrue(res.data['next'])
+
+    def test_delta_sync_returns_only_changes(self):
+        unchanged = create_recipe(user=self.user, title="unchanged")
+        changed = create_recipe(user=self.user, title="changed")
+        retagged = create_recipe(user=self.user, title="retagged")
+        deleted = create_recipe(user=self.user, title="deleted")
+        deleted_id = deleted.id
+        old_tag = Tag.objects.create(user=self.user, name="old")
+        token = self.client.get(SYNC_URL).data['next']
+
+        changed.title = "changed again"
+        changed.save()
+        retagged.tags.add(old_tag)
+        deleted.delete()
+        ing = Ingredient.objects.create(user=self.user, name="salt")
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertFalse(res.data['full'])
+        self.assertCountEqual(
+            [r['id'] for r in res.data['recipes']], [changed.id, retagged.id],
+        )
+        self.assertNotIn(unchanged.id, [r['id'] for r in res.data['recipes']])
+        self.assertEqual(res.data['tags'], [])
+        self.assertEqual([i['id'] for i in res.data['ingredients']], [ing.id])
+        self.assertEqual(res.data['deleted']['recipes'], [deleted_id])
+
+    def test_deleted_tag_updates_its_recipes(self):
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name="gone")
+        recipe.tags.add(tag)
+        tag_id = tag.id
+        token = self.client.get(SYNC_URL).data['next']
+
+        self.client.delete(reverse('recipe:tag-detail', args=[tag_id]))
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual(res.data['deleted']['tags'], [tag_id])
+        self.assertEqual([r['id'] for r in res.data['recipes']], [recipe.id])
+        self.assertEqual(res.data['recipes'][0]['tags'], [])
+
+    def test_tombstones_only_for_own_user(self):
+        other = get_user_model().objects.create_user("o@example.com", "pass@123")
+        token = self.client.get(SYNC_URL).data['next']
+        create_recipe(user=other).delete()
+
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual(res.data['deleted']['recipes'], [])
+
+    def test_invalid_token(self):
+        res = self.client.get(SYNC_URL, {'since': 'not-a-token'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_token_older_than_retention_forces_full_sync(self):
+        create_recipe(user=self.user)
+        old = timezone.now() - timedelta(days=365)
+        token = signing.dumps(old.isoformat(), salt=SyncView.token_salt)
+
+        res = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertTrue(res.data['full'])
+        self.assertEqual(len(res.data['recipes']), 1)
+
+    def test_deleting_user_skips_tombstones(self):
+        create_recipe(user=self.user)
+        Tag.objects.create(user=self.user, name="tag")
+
+        self.user.delete()
+
+        self.assertFalse(Tombstone.objects.exists())
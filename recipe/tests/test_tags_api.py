@@ -1,7 +1,9 @@
 """
 Tests for the tags
 """
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from core.models import Tag, Recipe
@@ -46,7 +48,7 @@ class PrivateTagsApiTests(TestCase):
         tags = Tag.objects.all().order_by('-id')
         serializer = TagSerializer(tags, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_retrive_tags_of_user_only(self):
         """Make sure tags we retrive are only of user who is retriving"""
@@ -65,9 +67,9 @@ class PrivateTagsApiTests(TestCase):
         
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 2)
-        self.assertEqual(res.data, serializer.data)
-        self.assertNotIn(serializer2.data, res.data)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(res.data['results'], serializer.data)
+        self.assertNotIn(serializer2.data, res.data['results'])
 
     def test_partial_update_tag(self):
         tag = Tag.objects.create(user=self.user, name="sweets")
@@ -117,4 +119,105 @@ class PrivateTagsApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(Tag.objects.filter(name='Dinner').count(), 0)
         self.assertEqual(Tag.objects.filter(name='Lunch').count(), 1)
-        self.assertIn(tag2, recipe.tags.all())
\ No newline at end of file
+        self.assertIn(tag2, recipe.tags.all())
+
+    def test_merge_tag_into_existing_keeps_shared_recipes_once(self):
+        """A recipe tagged with both merged tags ends up with one link"""
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        both = Recipe.objects.create(
+            user=self.user, title="Both", time_minutes=10, price=Decimal("5.00"),
+        )
+        only_dinner = Recipe.objects.create(
+            user=self.user, title="Dinner", time_minutes=10, price=Decimal("5.00"),
+        )
+        both.tags.add(dinner, lunch)
+        only_dinner.tags.add(dinner)
+
+        res = self.client.patch(detail_url(dinner.id), {'name': 'Lunch'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['id'], lunch.id)
+        self.assertFalse(Tag.objects.filter(id=dinner.id).exists())
+        self.assertEqual(list(both.tags.all()), [lunch])
+        self.assertEqual(list(only_dinner.tags.all()), [lunch])
+
+    def test_merge_tag_only_touches_moved_recipes(self):
+        dinner = Tag.objects.create(user=self.user, name='Dinner')
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        moved = Recipe.objects.create(
+            user=self.user, title="Moved", time_minutes=10, price=Decimal("5.00"),
+        )
+        untouched = Recipe.objects.create(
+            user=self.user, title="Untouched", time_minutes=10, price=Decimal("5.00"),
+        )
+        moved.tags.add(dinner)
+        untouched.tags.add(lunch)
+        moved.refresh_from_db()
+        untouched.refresh_from_db()
+
+        self.client.patch(detail_url(dinner.id), {'name': 'Lunch'})
+
+        self.assertGreater(
+            Recipe.objects.get(id=moved.id).updated_at, moved.updated_at,
+        )
+        self.assertEqual(
+            Recipe.objects.get(id=untouched.id).updated_at, untouched.updated_at,
+        )
+
+    def test_merge_tag_query_count_constant(self):
+        """Merging doesn't issue queries per tagged recipe"""
+        counts = []
+        for size in (1, 10):
+            old = Tag.objects.create(user=self.user, name=f'old{size}')
+            Tag.objects.create(user=self.user, name=f'new{size}')
+            for _ in range(size):
+                recipe = Recipe.objects.create(
+                    user=self.user, title="r", time_minutes=1, price=Decimal("1.00"),
+                )
+                recipe.tags.add(old)
+
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(detail_url(old.id), {'name': f'new{size}'})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            counts.append(len(queries))
+
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(
+            Recipe.objects.filter(user=self.user, tags__name='new10').count(), 10,
+        )
+
+    def test_filter_tags_assigned_to_recipes(self):
+        tag1 = Tag.objects.create(user=self.user, name='Breakfast')
+        tag2 = Tag.objects.create(user=self.user, name='Lunch')
+        recipe = Recipe.objects.create(
+            user=self.user,
+            title="Green Eggs on Toast",
+            time_minutes=10,
+            price=Decimal("2.50"),
+        )
+        recipe.tags.add(tag1)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        s1 = TagSerializer(tag1)
+        s2 = TagSerializer(tag2)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
+
+    def test_filtered_tags_unique(self):
+        """Tags used by several recipes are listed once"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        Tag.objects.create(user=self.user, name='Dinner')
+        for title in ('Pancakes', 'Porridge'):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                time_minutes=5,
+                price=Decimal("1.00"),
+            )
+            recipe.tags.add(tag)
+
+        res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
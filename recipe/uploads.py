@@ -0,0 +1,204 @@
+"""
+Resumable chunked uploads of recipe images.
+
+A client announces the file (start), sends it in any number of PATCHes
+that each carry the offset they continue from (append), and finally
+attaches it to the recipe (complete). Bytes are streamed straight to a
+temp file in RECIPE_IMAGE_UPLOAD_DIR instead of being buffered by
+Django's upload handlers, and the image header is checked as soon as it
+has arrived, so a non-image is refused after its first chunk.
+"""
+import fcntl
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+from core.models import ImageUpload
+from recipe import images
+
+READ_SIZE = 64 * 1024
+# Pillow needs the header (with any EXIF before it) to identify a file
+HEADER_BYTES = 256 * 1024
+# Where Pillow lists a less common one first, e.g. .jfif for JPEG; MPO
+# is what Pillow calls JPEGs from some cameras
+PREFERRED_EXTENSIONS = {'JPEG': '.jpg', 'MPO': '.jpg', 'TIFF': '.tif'}
+
+
+class OffsetMismatch(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Upload-Offset does not match the bytes received.'
+    default_code = 'offset_mismatch'
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Chunk goes past the announced size.'
+    default_code = 'too_large'
+
+
+def image_filename(filename, fmt):
+    """
+    filename with the extension of the format Pillow detected, since the
+    stored name's extension decides the Content-Type it is served with.
+    """
+    extensions = [
+        ext for ext, name in Image.registered_extensions().items() if name == fmt
+    ]
+    ext = PREFERRED_EXTENSIONS.get(fmt) or next(iter(extensions), None)
+    if ext is None:
+        raise ValidationError({'image': ['Unsupported image format.']})
+    return os.path.splitext(os.path.basename(filename))[0] + ext
+
+
+def upload_path(upload):
+    return os.path.join(settings.RECIPE_IMAGE_UPLOAD_DIR, str(upload.id))
+
+
+def start(recipe, filename, size):
+    os.makedirs(settings.RECIPE_IMAGE_UPLOAD_DIR, exist_ok=True)
+    upload = ImageUpload.objects.create(
+        recipe=recipe, filename=filename, size=size,
+        expires_at=timezone.now() + settings.RECIPE_IMAGE_UPLOAD_LIFETIME,
+    )
+    open(upload_path(upload), 'wb').close()
+    return upload
+
+
+def read_header(path, received, size):
+    """
+    The image format once Pillow can identify the file, None while more
+    of the header is still to come. Only the header is read, the pixel
+    data is not decoded.
+    """
+    too_large = ValidationError({'image': ['Image has too many pixels.']})
+    try:
+        with Image.open(path) as img:
+            if Image.MAX_IMAGE_PIXELS and img.width * img.height > Image.MAX_IMAGE_PIXELS:
+                raise too_large
+            return img.format
+    except Image.DecompressionBombError:
+        raise too_large
+    except (OSError, EOFError, ValueError):
+        if received < min(size, HEADER_BYTES):
+            return None
+    raise ValidationError({'image': ['Upload a valid image.']})
+
+
+def append(upload, stream, offset, length):
+    """
+    Write length bytes of stream at offset and return the updated upload.
+    Whatever arrives before the client disconnects is kept, so it can
+    resume from the new offset.
+
+    No transaction is open while the body arrives: writers are kept apart
+    by a lock on the temp file, and the new offset is only stored if the
+    recorded one is still the offset the chunk started from.
+    """
+    path = upload_path(upload)
+    try:
+        temp_file = open(path, 'r+b')
+    except FileNotFoundError:
+        raise OffsetMismatch('The upload was discarded.')
+    with temp_file:
+        try:
+            fcntl.flock(temp_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise OffsetMismatch('Another chunk of this upload is being written.')
+        upload.refresh_from_db()
+        if offset != upload.offset:
+            raise OffsetMismatch()
+        if offset + length > upload.size:
+            raise UploadTooLarge()
+
+        # Drops bytes past the recorded offset from an interrupted request
+        temp_file.seek(offset)
+        temp_file.truncate()
+        remaining = length
+        while remaining:
+            chunk = stream.read(min(READ_SIZE, remaining))
+            if not chunk:
+                break
+            temp_file.write(chunk)
+            remaining -= len(chunk)
+        temp_file.flush()
+
+        invalid = None
+        fmt = upload.format
+        received = offset + length - remaining
+        if not fmt:
+            try:
+                fmt = read_header(path, received, upload.size) or ''
+            except ValidationError as exc:
+                invalid = exc
+        expires_at = timezone.now() + settings.RECIPE_IMAGE_UPLOAD_LIFETIME
+        stored = ImageUpload.objects.filter(pk=upload.pk, offset=offset).update(
+            offset=received, format=fmt, expires_at=expires_at,
+        )
+        if not stored:
+            raise OffsetMismatch()
+        upload.offset, upload.format, upload.expires_at = received, fmt, expires_at
+
+    if invalid is not None:
+        discard(upload)
+        raise invalid
+    return upload
+
+
+def complete(upload):
+    """Store the finished file as the recipe's image (recipe.images)."""
+    with transaction.atomic():
+        upload = ImageUpload.objects.select_for_update().select_related(
+            'recipe',
+        ).get(pk=upload.pk)
+        if upload.offset != upload.size:
+            raise ValidationError(
+                {'detail': f'Received {upload.offset} of {upload.size} bytes.'},
+            )
+        with open(upload_path(upload), 'rb') as temp_file:
+            try:
+                # Checks the whole file is there, without decoding it
+                with Image.open(temp_file) as img:
+                    fmt = img.format
+                    img.verify()
+            except Exception:
+                invalid = ValidationError({'image': ['Upload a valid image.']})
+            else:
+                invalid = None
+                temp_file.seek(0)
+                # Never the client's extension: evil.html would be served as HTML
+                name = image_filename(upload.filename, fmt)
+                images.store_image(upload.recipe, File(temp_file, name=name))
+                discard(upload)
+
+    if invalid is not None:
+        discard(upload)
+        raise invalid
+    return upload.recipe
+
+
+def discard(upload):
+    """Forget the upload and delete its temp file after commit."""
+    path = upload_path(upload)
+    ImageUpload.objects.filter(pk=upload.pk).delete()
+    transaction.on_commit(lambda: _remove(path))
+
+
+def purge_expired():
+    """Discard abandoned uploads; returns how many there were."""
+    expired = list(ImageUpload.objects.filter(expires_at__lte=timezone.now()))
+    for upload in expired:
+        discard(upload)
+    return len(expired)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,32 +1,149 @@
-from django.shortcuts import render
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.shortcuts import get_object_or_404, render
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 # Create your views here.
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from core.models import ImageUpload, Recipe, Tag, Ingredient, Tombstone, SEARCH_CONFIG
+from recipe import bulk, formats, images, serializers, uploads
+from recipe.cache import CachedListMixin, ConditionalRecipeMixin
+from user.authentication import CachedTokenAuthentication
+
+UUID_PATTERN = '[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}'
+UPLOAD_ID_PARAMETER = OpenApiParameter('upload_id', OpenApiTypes.UUID, OpenApiParameter.PATH)
+
+
+def _params_to_ints(param, value):
+    """Convert a comma separated string like '1,2,3' to a list of ints."""
+    try:
+        return [int(str_id) for str_id in value.split(',')]
+    except ValueError:
+        raise ValidationError({param: 'Expected a comma separated list of ids.'})
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'tags',
+                OpenApiTypes.STR,
+                description='Comma separated list of tag IDs to filter',
+            ),
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                description='Comma separated list of ingredient IDs to filter',
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description='Whether recipes need any (default) or all of the '
+                            'given tags/ingredients',
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Full-text search over title, description, tag and '
+                            'ingredient names; results are ordered by relevance',
+            ),
+        ]
+    )
+)
+class RecipeViewSet(
+        CachedListMixin,
+        ConditionalRecipeMixin,
+        viewsets.ModelViewSet,
+    ):
     """
     View for managing recipe APIs
     """
     serializer_class =  serializers.RecipeDetailSerializer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    bulk_max_items = 500
+    export_chunk_size = 500
+    import_batch_size = 500
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user).order_by('-id')
+        params = self.request.query_params
+        if self.action == 'list':
+            match = params.get('match', 'any')
+            if match not in ('any', 'all'):
+                raise ValidationError({'match': "Expected 'any' or 'all'."})
+            match_all = match == 'all'
+            for field in ('tags', 'ingredients'):
+                if params.get(field):
+                    ids = _params_to_ints(field, params[field])
+                    queryset = self._filter_by_attr(queryset, field, ids, match_all)
+            if params.get('search'):
+                queryset = self._search(queryset, params['search'])
+        if self.action in ('list', 'retrieve'):
+            # Load tags/ingredients for the whole page in two queries and
+            # only select the columns the serializer actually renders.
+            queryset = queryset.prefetch_related('tags', 'ingredients').only(
+                *self._serializer_columns()
+            )
+        else:
+            queryset = queryset.defer('search_vector')
+        return queryset
+
+    def _search(self, queryset, terms):
+        """Match terms against the GIN indexed search_vector, best first"""
+        query = SearchQuery(terms, search_type='websearch', config=SEARCH_CONFIG)
+        # Cast to double so the rank round-trips exactly through the cursor
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        return queryset.filter(search_vector=query).annotate(
+            rank=rank,
+        ).order_by('-rank', '-id')
+
+    def _filter_by_attr(self, queryset, field, ids, match_all):
+        """
+        Restrict queryset to recipes linked to any/all of the given ids,
+        resolved as a semi-join on the through table so it stays one query
+        and uses its (attr_id, recipe_id) index.
+        """
+        relation = Recipe._meta.get_field(field)
+        target = relation.m2m_reverse_field_name()
+        rows = relation.remote_field.through.objects.filter(**{f'{target}__in': ids})
+        if match_all:
+            rows = rows.values('recipe_id').annotate(
+                matched=Count(target),
+            ).filter(matched=len(set(ids)))
+        return queryset.filter(id__in=rows.values('recipe_id'))
+
+    def _serializer_columns(self):
+        columns = {f.name for f in Recipe._meta.concrete_fields}
+        # By source, so e.g. thumbnail loads image_variants
+        sources = {field.source for field in self.get_serializer_class()().fields.values()}
+        return sorted(sources & columns)
     
     def get_serializer_class(self, *args, **kwargs):
         if self.action == 'list':
             return serializers.RecipeSerializer
-        elif self.action == 'upload_image':
+        elif self.action in ('upload_image', 'complete_upload'):
             return serializers.RecipeImageSerializer
+        elif self.action in ('start_upload', 'upload_chunk'):
+            return serializers.ImageUploadSerializer
         return self.serializer_class
     
     def perform_create(self, serializer):
@@ -37,23 +154,265 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe = self.get_object()
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status.HTTP_200_OK)
+            # Stored deduplicated by content; variants are rendered by
+            # `manage.py run_image_worker`
+            images.store_image(recipe, serializer.validated_data['image'])
+            return Response(
+                self.get_serializer(recipe).data, status.HTTP_200_OK,
+            )
         return Response(serializer.errors, status.HTTP_400_BAD_REQUEST)
 
+    def _get_upload(self, upload_id):
+        return get_object_or_404(
+            ImageUpload, recipe=self.get_object(), pk=upload_id,
+            expires_at__gt=timezone.now(),
+        )
+
+    @extend_schema(
+        description='Start a resumable upload of an image of the given size '
+                    'in bytes; send it with PATCH to the returned upload.',
+    )
+    @action(methods=['POST'], detail=True, url_path='uploads')
+    def start_upload(self, request, pk=None):
+        recipe = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = uploads.start(recipe, **serializer.validated_data)
+        return Response(self.get_serializer(upload).data, status.HTTP_201_CREATED)
+
+    @extend_schema(
+        methods=['PATCH'],
+        parameters=[
+            UPLOAD_ID_PARAMETER,
+            OpenApiParameter(
+                'Upload-Offset',
+                OpenApiTypes.INT,
+                OpenApiParameter.HEADER,
+                required=True,
+                description='Offset the chunk starts at, the current offset of the upload',
+            ),
+        ],
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+        description='Append the body to the upload. Non-images are rejected '
+                    'as soon as their header has arrived; after a failure, '
+                    'GET the upload and resume from its offset.',
+    )
+    @extend_schema(methods=['GET', 'DELETE'], parameters=[UPLOAD_ID_PARAMETER])
+    @action(
+        methods=['GET', 'PATCH', 'DELETE'], detail=True,
+        url_path=f'uploads/(?P<upload_id>{UUID_PATTERN})',
+    )
+    def upload_chunk(self, request, pk=None, upload_id=None):
+        upload = self._get_upload(upload_id)
+        if request.method == 'DELETE':
+            uploads.discard(upload)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if request.method == 'PATCH':
+            try:
+                offset = int(request.headers['Upload-Offset'])
+                length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except (KeyError, ValueError):
+                raise ValidationError({'detail': 'Upload-Offset header is required.'})
+            # Read straight from the request, never through the parsers
+            upload = uploads.append(upload, request.stream, offset, length)
+        return Response(self.get_serializer(upload).data, status.HTTP_200_OK)
+
+    @extend_schema(request=None, parameters=[UPLOAD_ID_PARAMETER])
+    @action(
+        methods=['POST'], detail=True,
+        url_path=f'uploads/(?P<upload_id>{UUID_PATTERN})/complete',
+    )
+    def complete_upload(self, request, pk=None, upload_id=None):
+        """Attach the fully received upload as the recipe's image."""
+        recipe = uploads.complete(self._get_upload(upload_id))
+        return Response(self.get_serializer(recipe).data, status.HTTP_200_OK)
+
+    @extend_schema(
+        request=serializers.RecipeDetailSerializer(many=True),
+        responses=OpenApiTypes.OBJECT,
+        description='POST a list of recipes to create, PATCH a list of partial '
+                    'recipes with their id to update, or DELETE a list of ids. '
+                    'Valid items are written even if others fail; failures are '
+                    'reported by their index in the request.',
+    )
+    @action(methods=['POST', 'PATCH', 'DELETE'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {'detail': 'Expected a list of items.'}, status.HTTP_400_BAD_REQUEST,
+            )
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {'detail': f'At most {self.bulk_max_items} items per request.'},
+                status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.method == 'POST':
+            valid, errors = bulk.validate_items(self.get_serializer(), items)
+            recipes = bulk.bulk_create_recipes(
+                request.user, [data for _, data in valid],
+            )
+            return self._bulk_response(valid, recipes, errors, status.HTTP_201_CREATED)
 
+        ids = [
+            item.get('id') if isinstance(item, dict) else item for item in items
+        ]
+        ids = [pk if isinstance(pk, int) else None for pk in ids]
+        owned = self.get_queryset().filter(id__in=[pk for pk in ids if pk])
+        if request.method == 'DELETE':
+            deleted = set(owned.values_list('id', flat=True))
+            owned.delete()
+            first, duplicates = self._first_mentions(ids, deleted)
+            valid = [(index, ids[index]) for index in first]
+            return self._bulk_response(
+                valid, [pk for _, pk in valid],
+                self._not_found(ids, deleted) + duplicates, status.HTTP_200_OK,
+            )
+
+        recipes = {recipe.id: recipe for recipe in owned}
+        first, duplicates = self._first_mentions(ids, recipes)
+        found = [(index, items[index]) for index in first]
+        errors = self._not_found(ids, recipes) + duplicates
+        valid, invalid = bulk.validate_items(
+            self.get_serializer(partial=True), [item for _, item in found],
+        )
+        # validate_items indexes into the found list, map back to the request
+        errors += [{**err, 'index': found[err['index']][0]} for err in invalid]
+        valid = [(found[i][0], data) for i, data in valid]
+        updated = bulk.bulk_update_recipes(
+            request.user,
+            [recipes[ids[index]] for index, _ in valid],
+            [data for _, data in valid],
+        )
+        return self._bulk_response(valid, updated, errors, status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'output',
+                OpenApiTypes.STR,
+                enum=list(formats.WRITERS),
+                description='File format, ndjson (default) or csv',
+            ),
+        ],
+        responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY},
+    )
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream the user's whole recipe library as a file download."""
+        output = request.query_params.get('output', 'ndjson')
+        if output not in formats.WRITERS:
+            return Response(
+                {'output': f'Expected one of {", ".join(formats.WRITERS)}.'},
+                status.HTTP_400_BAD_REQUEST,
+            )
+        # iterator() reads through a server-side cursor and prefetches tags
+        # and ingredients per chunk, so memory doesn't grow with the library.
+        recipes = self.get_queryset().order_by('id').prefetch_related(
+            'tags', 'ingredients',
+        ).only(*[field for field in formats.FIELDS if field not in bulk.ATTR_MODELS])
+        rows = (
+            formats.recipe_to_row(recipe)
+            for recipe in recipes.iterator(chunk_size=self.export_chunk_size)
+        )
+        response = StreamingHttpResponse(
+            formats.WRITERS[output](rows),
+            content_type=formats.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="recipes.{output}"'
+        return response
+
+    @extend_schema(
+        request={
+            'multipart/form-data': {
+                'type': 'object',
+                'properties': {'file': {'type': 'string', 'format': 'binary'}},
+            },
+        },
+        responses=OpenApiTypes.OBJECT,
+        description='Import recipes from an NDJSON or CSV file (picked by '
+                    'extension) in the export format; reports created rows, '
+                    'per-row errors and throughput.',
+    )
+    @action(
+        methods=['POST'], detail=False, url_path='import', url_name='import',
+        parser_classes=[MultiPartParser],
+    )
+    def import_recipes(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response(
+                {'file': ['No file was submitted.']}, status.HTTP_400_BAD_REQUEST,
+            )
+        stats = bulk.import_rows(
+            request.user,
+            formats.read_file(upload.file, formats.format_for(upload.name)),
+            self.get_serializer(),
+            batch_size=self.import_batch_size,
+        )
+        return Response(stats, status.HTTP_200_OK)
+
+    def _not_found(self, ids, found):
+        return [
+            {'index': index, 'errors': {'id': ['Not found.']}}
+            for index, pk in enumerate(ids) if pk not in found
+        ]
+
+    def _first_mentions(self, ids, found):
+        """Indexes of the first mention of each found id, and errors for repeats."""
+        first, duplicates = [], []
+        for index, pk in enumerate(ids):
+            if pk not in found:
+                continue
+            if pk in ids[:index]:
+                duplicates.append({'index': index, 'errors': {'id': ['Duplicate id.']}})
+            else:
+                first.append(index)
+        return first, duplicates
+
+    def _bulk_response(self, valid, written, errors, success_status):
+        results = [
+            {'index': index, 'id': getattr(obj, 'id', obj)}
+            for (index, _), obj in zip(valid, written)
+        ]
+        errors = sorted(errors, key=lambda err: err['index'])
+        if errors and not results:
+            success_status = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results, 'errors': errors}, success_status)
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'assigned_only',
+                OpenApiTypes.INT, enum=[0, 1],
+                description='Filter by items assigned to recipes',
+            ),
+        ]
+    )
+)
 class BaseRecipeAttrViewSet(
+        CachedListMixin,
         mixins.UpdateModelMixin,
         mixins.ListModelMixin, 
         mixins.DestroyModelMixin,
         mixins.RetrieveModelMixin, 
         viewsets.GenericViewSet
     ):
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user).order_by('-id')
+        if self.request.query_params.get('assigned_only') == '1':
+            relation = self.queryset.model._meta.get_field('recipe')
+            target = relation.field.m2m_reverse_field_name()
+            queryset = queryset.filter(
+                id__in=relation.through.objects.values(f'{target}_id')
+            )
+        return queryset
         
 class TagViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.TagSerializer
@@ -61,4 +420,78 @@ class TagViewSet(BaseRecipeAttrViewSet):
     
 class IngredientViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientSerializer
-    queryset = Ingredient.objects.all()
\ No newline at end of file
+    queryset = Ingredient.objects.all()
+
+
+class SyncView(APIView):
+    """
+    Everything in the user's library created, updated or deleted since
+    the sync token returned by the previous call. Without a token (or
+    with one older than the tombstone retention) the whole library is
+    returned with full=true and the client should replace its copy.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    token_salt = 'recipe.sync'
+    # Writes stamped just before a sync but committed after it are sent
+    # again next time instead of being missed; clients upsert by id.
+    overlap = timedelta(seconds=5)
+
+    def _parse_token(self, token):
+        if not token:
+            return None
+        try:
+            since = parse_datetime(signing.loads(token, salt=self.token_salt))
+        except (signing.BadSignature, TypeError, ValueError):
+            raise ValidationError({'since': 'Invalid sync token.'})
+        retention = timedelta(days=settings.RECIPE_SYNC_TOMBSTONE_DAYS)
+        if since is None or since < timezone.now() - retention:
+            return None
+        return since
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'since',
+                OpenApiTypes.STR,
+                description='Sync token from the previous response',
+            ),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request):
+        now = timezone.now()
+        since = self._parse_token(request.query_params.get('since'))
+        user = request.user
+        recipes = Recipe.objects.filter(user=user).prefetch_related(
+            'tags', 'ingredients',
+        ).defer('search_vector').order_by('id')
+        tags = Tag.objects.filter(user=user).order_by('id')
+        ingredients = Ingredient.objects.filter(user=user).order_by('id')
+        deleted = {'recipes': [], 'tags': [], 'ingredients': []}
+        if since is not None:
+            # All four lookups are range scans on (user, timestamp) indexes
+            recipes = recipes.filter(updated_at__gte=since)
+            tags = tags.filter(updated_at__gte=since)
+            ingredients = ingredients.filter(updated_at__gte=since)
+            tombstones = Tombstone.objects.filter(
+                user=user, deleted_at__gte=since,
+            ).values_list('kind', 'object_id')
+            for kind, object_id in tombstones:
+                deleted[f'{kind}s'].append(object_id)
+
+        context = {'request': request}
+        return Response({
+            'full': since is None,
+            'recipes': serializers.RecipeDetailSerializer(
+                recipes, many=True, context=context,
+            ).data,
+            'tags': serializers.TagSerializer(tags, many=True).data,
+            'ingredients': serializers.IngredientSerializer(
+                ingredients, many=True,
+            ).data,
+            'deleted': deleted,
+            'next': signing.dumps(
+                (now - self.overlap).isoformat(), salt=self.token_salt,
+            ),
+        })
@@ -0,0 +1,141 @@
+"""
+Token authentication that skips the database on the hot path.
+
+Token lookups are kept in a bounded in-process LRU and, when
+TOKEN_AUTH_SHARED_CACHE names a cache alias, in that shared cache too.
+Entries are evicted when the token is deleted or its user is saved
+(deactivation, password change); other processes' local entries expire
+after TOKEN_AUTH_CACHE_TIMEOUT seconds. Token expiry is checked on every
+request, cached or not.
+"""
+import copy
+import hmac
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core.models import AuthToken
+
+
+class LocalTTLCache:
+    """Thread-safe LRU holding at most maxsize entries for timeout seconds."""
+
+    def __init__(self, maxsize, timeout):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+local_cache = LocalTTLCache(
+    settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TIMEOUT,
+)
+
+
+def _shared_cache():
+    alias = settings.TOKEN_AUTH_SHARED_CACHE
+    return caches[alias] if alias else None
+
+
+def _cache_key(key_hash):
+    # Keyed by the stored hash, so entries can be evicted without the key
+    # and no raw credential ever reaches a shared cache.
+    return f'auth:token:{key_hash}'
+
+
+def evict_token(key_hash):
+    cache_key = _cache_key(key_hash)
+    local_cache.delete(cache_key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(cache_key)
+
+
+def _remember(token):
+    cache_key = _cache_key(token.key_hash)
+    local_cache.set(cache_key, token)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.set(cache_key, token, settings.TOKEN_AUTH_CACHE_TIMEOUT)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Authenticates "Token <prefix>.<secret>" against core.models.AuthToken,
+    through the token caches above.
+    """
+    model = AuthToken
+
+    def _lookup(self, key):
+        prefix, dot, secret = key.partition('.')
+        if not secret:
+            return None
+        try:
+            token = self.model.objects.select_related('user').get(prefix=prefix)
+        except self.model.DoesNotExist:
+            return None
+        if not hmac.compare_digest(token.key_hash, self.model.hash_key(key)):
+            return None
+        return token
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(self.model.hash_key(key))
+        token = local_cache.get(cache_key)
+        shared = _shared_cache()
+        if token is None and shared is not None:
+            token = shared.get(cache_key)
+            if token is not None:
+                local_cache.set(cache_key, token)
+        if token is None:
+            token = self._lookup(key)
+            if token is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+            _remember(token)
+
+        if token.is_expired():
+            evict_token(token.key_hash)
+            raise exceptions.AuthenticationFailed(_('Token has expired.'))
+        if token.refresh():
+            _remember(token)
+
+        # A copy per request, so one request's changes to request.user
+        # never leak into another's.
+        return (copy.copy(token.user), token)
@@ -1,16 +1,64 @@
 # user/backends.py
 
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _missing_key(email):
+    return 'auth:missing:' + hashlib.sha256(email.encode()).hexdigest()
+
+
+def _get_cache():
+    alias = settings.AUTH_MISSING_EMAIL_CACHE_ALIAS
+    return caches[alias] if alias is not None else None
+
+
+def _forget(email):
+    cache = _get_cache()
+    if cache is not None:
+        cache.delete(_missing_key(email))
+
+
+def forget_missing(email):
+    """
+    Drop the negative lookup entry once the account exists. Again on
+    commit, in case a login in between re-cached the miss.
+    """
+    _forget(email)
+    transaction.on_commit(lambda: _forget(email))
+
 
 class EmailBackend(ModelBackend):
+    """
+    Costs one password hash whether or not the email exists, so timing
+    doesn't reveal accounts and CPU per attempt is flat. Emails found
+    missing are remembered for a while so repeated misses skip the DB.
+    """
+
     def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None or password is None:
+            return None
         UserModel = get_user_model()
-        try:
-            user = UserModel.objects.get(email=username)
-        except UserModel.DoesNotExist:
+        cache = _get_cache()
+        user = None
+        if cache is None or not cache.get(_missing_key(username)):
+            try:
+                user = UserModel.objects.get(email=username)
+            except UserModel.DoesNotExist:
+                if cache is not None:
+                    cache.set(
+                        _missing_key(username), True,
+                        settings.AUTH_MISSING_EMAIL_CACHE_TIMEOUT,
+                    )
+        if user is None:
+            # Same hasher and cost as checking a real password
+            UserModel().set_password(password)
             return None
-        else:
-            if user.check_password(password) and user.is_active:
-                return user
+        if user.check_password(password) and user.is_active:
+            return user
         return None
@@ -0,0 +1,23 @@
+"""
+Password hashers whose cost comes from settings.
+
+Changing a cost setting makes must_update() true for hashes made with
+the old one, so Django rehashes them on the next successful login.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, ScryptPasswordHasher
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    work_factor = settings.SCRYPT_WORK_FACTOR
+    block_size = settings.SCRYPT_BLOCK_SIZE
+    parallelism = settings.SCRYPT_PARALLELISM
+    # Only an upper bound; OpenSSL's 32 MiB default rejects work factors
+    # above 2 ** 14 at the default block size.
+    maxmem = 2 ** 30
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = settings.ARGON2_TIME_COST
+    memory_cost = settings.ARGON2_MEMORY_COST
+    parallelism = settings.ARGON2_PARALLELISM
@@ -0,0 +1,58 @@
+"""
+Django command to time each password hasher profile
+"""
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    """Hash and verify a password with each profile's current cost settings."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'profiles', nargs='*',
+            help='Profiles to time, all by default: ' + ', '.join(settings.PASSWORD_HASHER_PROFILES),
+        )
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument(
+            '--budget-ms', type=float,
+            help='Flag profiles whose slowest login check exceeds this',
+        )
+
+    def time_hasher(self, hasher, rounds):
+        password = 'benchmark-password'
+        encoded = hasher.encode(password, hasher.salt())
+        timings = []
+        for _ in range(rounds):
+            # A login is one verify
+            started = time.perf_counter()
+            hasher.verify(password, encoded)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+    def handle(self, *args, **options):
+        """Entrypoint for command"""
+        unknown = set(options['profiles']) - set(settings.PASSWORD_HASHER_PROFILES)
+        if unknown:
+            raise CommandError(f"Unknown profiles: {', '.join(sorted(unknown))}")
+
+        for profile in options['profiles'] or settings.PASSWORD_HASHER_PROFILES:
+            hasher = import_string(settings.PASSWORD_HASHER_PROFILES[profile])()
+            try:
+                timings = self.time_hasher(hasher, options['rounds'])
+            except ValueError as exc:
+                # Optional library (argon2-cffi) not installed
+                self.stdout.write(f'{profile}: skipped ({exc})')
+                continue
+
+            line = '{}: median {:.1f} ms, max {:.1f} ms over {} rounds'.format(
+                profile, statistics.median(timings), max(timings), len(timings),
+            )
+            if options['budget_ms'] is not None and max(timings) > options['budget_ms']:
+                self.stdout.write(self.style.WARNING(f'{line} (over budget)'))
+            else:
+                self.stdout.write(line)
@@ -45,6 +45,8 @@ class AuthTokenSerializer(serializers.Serializer):
         style={"input_type":"password"},
         trim_whitespace=False,
     )
+    # Device label for the issued token, e.g. "Pixel 8"
+    name = serializers.CharField(max_length=100, required=False, allow_blank=True)
 
     def validate(self, attrs):
         email = attrs.get('email')
@@ -0,0 +1,25 @@
+"""
+Signal handlers evicting cached authentication lookups
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import AuthToken
+from user.authentication import evict_token
+from user.backends import forget_missing
+
+
+@receiver(post_delete, sender=AuthToken)
+def token_deleted(sender, instance, **kwargs):
+    evict_token(instance.key_hash)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, **kwargs):
+    # New account, or an email change
+    forget_missing(instance.email)
+    # Covers deactivation and password changes, and keeps request.user fresh
+    if not created:
+        for key_hash in instance.auth_tokens.values_list('key_hash', flat=True):
+            evict_token(key_hash)
@@ -0,0 +1,205 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import AuthToken
+from user.authentication import LocalTTLCache, local_cache
+
+ME_URL = reverse('user:me')
+TOKEN_URL = reverse('user:token')
+
+
+def create_user(**params):
+    defaults = {'email': 'test@example.com', 'password': 'testpass123', 'name': 'Test',
+                'is_active': True}
+    defaults.update(params)
+    return get_user_model().objects.create_user(**defaults)
+
+
+class LocalTTLCacheTests(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = LocalTTLCache(maxsize=2, timeout=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(len(lru), 2)
+
+    @patch('user.authentication.time.monotonic')
+    def test_entries_expire(self, patched_monotonic):
+        lru = LocalTTLCache(maxsize=10, timeout=60)
+        patched_monotonic.return_value = 100
+        lru.set('a', 1)
+
+        patched_monotonic.return_value = 159
+        self.assertEqual(lru.get('a'), 1)
+        patched_monotonic.return_value = 160
+        self.assertIsNone(lru.get('a'))
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        local_cache.clear()
+        self.user = create_user()
+        self.token, self.key = AuthToken.objects.create_token(self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.key}')
+
+    def auth_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [q['sql'] for q in ctx.captured_queries if 'core_authtoken' in q['sql']]
+
+    def test_repeat_requests_skip_token_query(self):
+        self.assertEqual(len(self.auth_queries()), 1)
+        self.assertEqual(self.auth_queries(), [])
+
+    def test_invalid_token_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_rejected(self):
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_reloads_user(self):
+        self.client.get(ME_URL)
+        self.user.name = 'Renamed'
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Renamed')
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE='default')
+    def test_shared_cache_serves_other_processes(self):
+        cache.clear()
+        self.client.get(ME_URL)
+        local_cache.clear()
+
+        self.assertEqual(self.auth_queries(), [])
+
+        self.token.delete()
+        local_cache.clear()
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_wrong_secret_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.prefix}.wrong')
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_rejected(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_login_with_expired_token_header(self):
+        cache.clear()
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+
+        res = self.client.post(
+            TOKEN_URL, {'email': self.user.email, 'password': 'testpass123'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('token', res.data)
+
+    def test_cached_token_expires(self):
+        self.client.get(ME_URL)
+        with patch('core.models.timezone.now') as patched_now:
+            patched_now.return_value = self.token.expires_at
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expiry_slides_after_half_lifetime(self):
+        soon = timezone.now() + timedelta(days=1)
+        AuthToken.objects.filter(pk=self.token.pk).update(expires_at=soon)
+
+        self.client.get(ME_URL)
+
+        self.token.refresh_from_db()
+        self.assertGreater(self.token.expires_at, soon + timedelta(days=1))
+        self.assertIsNotNone(self.token.last_used_at)
+
+    def test_fresh_token_not_written(self):
+        expires_at = self.token.expires_at
+        self.client.get(ME_URL)
+
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.expires_at, expires_at)
+        self.assertIsNone(self.token.last_used_at)
+
+
+class AuthTokenApiTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+
+    def test_token_per_device(self):
+        payload = {'email': self.user.email, 'password': 'testpass123'}
+        phone = self.client.post(TOKEN_URL, {**payload, 'name': 'phone'})
+        laptop = self.client.post(TOKEN_URL, {**payload, 'name': 'laptop'})
+
+        self.assertEqual(phone.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(phone.data['token'], laptop.data['token'])
+        self.assertEqual(
+            sorted(self.user.auth_tokens.values_list('name', flat=True)),
+            ['laptop', 'phone'],
+        )
+        self.assertFalse(AuthToken.objects.filter(key_hash=phone.data['token']).exists())
+
+    def test_delete_revokes_only_current_token(self):
+        _, key = AuthToken.objects.create_token(self.user, name='phone')
+        _, other = AuthToken.objects.create_token(self.user, name='laptop')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {key}')
+
+        res = self.client.delete(TOKEN_URL)
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {other}')
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_200_OK)
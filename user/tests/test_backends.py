@@ -0,0 +1,47 @@
+from unittest.mock import patch
+
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+
+class EmailBackendTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@example.com', password='testpass123', is_active=True,
+        )
+
+    def test_authenticate(self):
+        self.assertEqual(authenticate(username='test@example.com', password='testpass123'), self.user)
+        self.assertIsNone(authenticate(username='test@example.com', password='wrongpass'))
+
+    @patch('django.contrib.auth.base_user.make_password')
+    def test_missing_email_still_hashes(self, patched_make_password):
+        self.assertIsNone(authenticate(username='nobody@example.com', password='testpass123'))
+        self.assertIsNone(authenticate(username='nobody@example.com', password='testpass123'))
+
+        patched_make_password.assert_called_with('testpass123')
+        self.assertEqual(patched_make_password.call_count, 2)
+
+    def test_repeated_misses_skip_database(self):
+        authenticate(username='nobody@example.com', password='testpass123')
+
+        with self.assertNumQueries(0):
+            authenticate(username='nobody@example.com', password='testpass123')
+
+    def test_misses_not_cached_without_shared_cache(self):
+        with self.settings(AUTH_MISSING_EMAIL_CACHE_ALIAS=None):
+            authenticate(username='nobody@example.com', password='testpass123')
+
+            with self.assertNumQueries(1):
+                authenticate(username='nobody@example.com', password='testpass123')
+
+    def test_new_account_clears_miss(self):
+        authenticate(username='new@example.com', password='testpass123')
+        user = get_user_model().objects.create_user(
+            email='new@example.com', password='testpass123', is_active=True,
+        )
+
+        self.assertEqual(authenticate(username='new@example.com', password='testpass123'), user)
@@ -0,0 +1,62 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from user.hashers import TunedScryptPasswordHasher
+
+TOKEN_URL = reverse('user:token')
+SCRYPT = 'user.hashers.TunedScryptPasswordHasher'
+PBKDF2 = 'django.contrib.auth.hashers.PBKDF2PasswordHasher'
+
+
+class RehashOnLoginTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_stale_hash_upgraded_on_login(self):
+        with override_settings(PASSWORD_HASHERS=[PBKDF2]):
+            user = get_user_model().objects.create_user(
+                email='test@example.com', password='testpass123', is_active=True,
+            )
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+        with override_settings(PASSWORD_HASHERS=[SCRYPT, PBKDF2]):
+            res = self.client.post(TOKEN_URL, {'email': user.email, 'password': 'testpass123'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+
+    def test_cost_change_flags_hash_for_update(self):
+        hasher = TunedScryptPasswordHasher()
+        encoded = hasher.encode('testpass123', hasher.salt())
+        self.assertFalse(hasher.must_update(encoded))
+
+        hasher.work_factor *= 2
+        self.assertTrue(hasher.must_update(encoded))
+        self.assertTrue(hasher.verify('testpass123', encoded))
+
+
+class BenchmarkHashersCommandTests(SimpleTestCase):
+
+    def test_reports_each_profile(self):
+        out = StringIO()
+
+        call_command('benchmark_hashers', 'fast', 'scrypt', rounds=1, budget_ms=0, stdout=out)
+
+        self.assertIn('fast: median', out.getvalue())
+        self.assertIn('scrypt: median', out.getvalue())
+        self.assertIn('(over budget)', out.getvalue())
+
+    def test_unknown_profile(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark_hashers', 'bogus', stdout=StringIO())
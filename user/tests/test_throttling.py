@@ -0,0 +1,112 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import OutgoingEmail
+
+TOKEN_URL = reverse('user:token')
+FORGOT_PASSWORD_URL = reverse('user:forgot-password')
+ACTIVATE_URL = reverse('user:activate')
+
+RATES = {
+    'login.ip': '4/min',
+    'login.email': '2/min',
+    'password_reset.ip': '10/hour',
+    'password_reset.email': '1/hour',
+    'email_token.ip': '1/hour',
+}
+
+
+@override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': RATES, 'NUM_PROXIES': 0})
+class AuthThrottleTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        get_user_model().objects.create_user(
+            email='test@example.com', password='testpass123', is_active=True,
+        )
+
+    def login(self, email='test@example.com', password='wrongpass'):
+        return self.client.post(TOKEN_URL, {'email': email, 'password': password})
+
+    def test_login_throttled_per_email(self):
+        self.login()
+        self.login()
+
+        res = self.login(password='testpass123')
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', res)
+        # Other accounts from the same IP are still allowed
+        self.assertEqual(self.login('other@example.com').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_login_throttled_per_ip(self):
+        for n in range(4):
+            self.login(f'user{n}@example.com')
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forwarded_for_not_trusted_without_proxies(self):
+        for n in range(4):
+            self.client.post(
+                TOKEN_URL, {'email': f'user{n}@example.com', 'password': 'wrongpass'},
+                HTTP_X_FORWARDED_FOR=f'10.0.0.{n}',
+            )
+
+        res = self.client.post(
+            TOKEN_URL, {'email': 'test@example.com', 'password': 'wrongpass'},
+            HTTP_X_FORWARDED_FOR='10.0.0.99',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_throttled_login_skips_password_check(self):
+        self.login()
+        self.login()
+
+        with patch('user.backends.EmailBackend.authenticate') as patched_authenticate:
+            self.login(password='testpass123')
+
+        patched_authenticate.assert_not_called()
+
+    def test_non_object_body(self):
+        for url in (TOKEN_URL, FORGOT_PASSWORD_URL):
+            res = self.client.post(url, [1, 2], format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_window_slides(self):
+        with patch('user.throttling.time.time') as patched_time:
+            patched_time.return_value = 600.0
+            self.login()
+            self.login()
+            patched_time.return_value = 660.0
+            self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            # Half of the previous minute's two attempts still count
+            patched_time.return_value = 690.0
+            self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(self.login().status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_forgot_password_throttled_per_email(self):
+        self.client.post(FORGOT_PASSWORD_URL, {'email': 'test@example.com'})
+
+        res = self.client.post(FORGOT_PASSWORD_URL, {'email': 'TEST@example.com'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(OutgoingEmail.objects.count(), 1)
+
+    def test_activate_throttled_per_ip(self):
+        self.client.post(ACTIVATE_URL, {'token': 'guess'})
+
+        res = self.client.post(ACTIVATE_URL, {'token': 'guess'})
+
+        self.assertEqual(res.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
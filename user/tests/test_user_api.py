@@ -1,3 +1,5 @@
+from django.core import mail
+from django.core.cache import cache
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
@@ -5,9 +7,14 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.models import EmailToken, OutgoingEmail
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+ACTIVATE_URL = reverse('user:activate')
+FORGOT_PASSWORD_URL = reverse('user:forgot-password')
+RESET_PASSWORD_URL = reverse('user:reset-password')
 
 def create_user(**params):
     return get_user_model().objects.create_user(**params)
@@ -15,6 +22,8 @@ def create_user(**params):
 class PublicUserApiTests(TestCase):
 
     def setUp(self):
+        # Throttle counters live in the cache
+        cache.clear()
         self.client = APIClient()
 
     def test_create_user_success(self):
@@ -30,6 +39,19 @@ class PublicUserApiTests(TestCase):
         self.assertTrue(user.check_password(payload['password']))
         self.assertNotIn('password', res.data)
 
+    def test_create_user_queues_activation_email(self):
+        payload = {
+            'email':'test@example.com',
+            'password': 'testpass123',
+            'name':'Test Name',
+        }
+        self.client.post(CREATE_USER_URL, payload)
+
+        self.assertEqual(mail.outbox, [])
+        queued = OutgoingEmail.objects.get()
+        self.assertEqual(queued.to, [payload['email']])
+        self.assertEqual(queued.status, OutgoingEmail.STATUS_QUEUED)
+
     def test_user_with_email_exists_error(self):
         payload = {
             'email':'test@example.com',
@@ -98,6 +120,64 @@ class PublicUserApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
+class EmailTokenApiTests(TestCase):
+    """Test activation and password reset tokens"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='testpass123', name='Test')
+
+    def test_activate_user(self):
+        _, key = EmailToken.objects.create_token(self.user, EmailToken.PURPOSE_ACTIVATION)
+
+        res = self.client.post(ACTIVATE_URL, {'token': key})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+        self.assertFalse(EmailToken.objects.exists())
+
+    def test_token_single_use(self):
+        _, key = EmailToken.objects.create_token(self.user, EmailToken.PURPOSE_ACTIVATION)
+        self.client.post(ACTIVATE_URL, {'token': key})
+
+        res = self.client.post(ACTIVATE_URL, {'token': key})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_expired_token_rejected(self):
+        token, key = EmailToken.objects.create_token(self.user, EmailToken.PURPOSE_ACTIVATION)
+        EmailToken.objects.filter(pk=token.pk).update(expires_at=token.created_at)
+
+        res = self.client.post(ACTIVATE_URL, {'token': key})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+    def test_token_only_valid_for_its_purpose(self):
+        _, key = EmailToken.objects.create_token(self.user, EmailToken.PURPOSE_ACTIVATION)
+        payload = {'token': key, 'password': 'newpass123', 'confirm_password': 'newpass123'}
+
+        res = self.client.post(RESET_PASSWORD_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_forgot_and_reset_password(self):
+        self.client.post(FORGOT_PASSWORD_URL, {'email': self.user.email})
+        key = OutgoingEmail.objects.get().body.rsplit(' ', 1)[1]
+        self.assertNotEqual(EmailToken.objects.get().key_hash, key)
+
+        payload = {'token': key, 'password': 'newpass123', 'confirm_password': 'newpass123'}
+        res = self.client.post(RESET_PASSWORD_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertFalse(EmailToken.objects.exists())
+
+
 class PrivateUserApiTests(TestCase):
 
     def setUp(self):
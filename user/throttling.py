@@ -0,0 +1,99 @@
+"""
+Sliding-window throttles for the unauthenticated auth endpoints.
+
+Counters live in the cache named by THROTTLE_CACHE_ALIAS: local memory
+in development and tests, a shared Redis-backed alias in production so
+every process sees the same counts. Each window is one key bumped with
+cache.incr(), which is atomic on Redis.
+
+Views pick the rates with `throttle_scope`; the rate for each throttle
+is DEFAULT_THROTTLE_RATES['<scope>.<kind>'], e.g. 'login.email'.
+"""
+import hashlib
+import time
+from collections.abc import Mapping
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def get_store():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def parse_rate(rate):
+    """'5/min' -> (5, 60)"""
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period[0]]
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Approximates a sliding window from two fixed ones: the previous
+    window's count is weighted by how much of it still overlaps.
+    """
+    kind = None
+
+    def get_key(self, request):
+        """Value identifying the client, or None to skip throttling."""
+        raise NotImplementedError('.get_key() must be overridden')
+
+    def allow_request(self, request, view):
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(
+            f'{getattr(view, "throttle_scope", None)}.{self.kind}'
+        )
+        key = self.get_key(request)
+        if rate is None or not key:
+            return True
+
+        num, period = parse_rate(rate)
+        window, elapsed = divmod(time.time(), period)
+        prefix = 'throttle:{}.{}:{}'.format(
+            view.throttle_scope, self.kind, hashlib.sha256(key.encode()).hexdigest()[:32],
+        )
+        current = f'{prefix}:{int(window)}'
+        store = get_store()
+        store.add(current, 0, timeout=2 * period)
+        try:
+            count = store.incr(current)
+        except ValueError:
+            # Evicted between add() and incr()
+            store.set(current, 1, timeout=2 * period)
+            count = 1
+        previous = store.get(f'{prefix}:{int(window) - 1}', 0)
+
+        if previous * (1 - elapsed / period) + count > num:
+            # Rejected requests don't count, as with DRF's own throttles
+            try:
+                store.decr(current)
+            except ValueError:
+                pass
+            self._wait = period - elapsed
+            return False
+        return True
+
+    def wait(self):
+        return getattr(self, '_wait', None)
+
+
+class IPThrottle(SlidingWindowThrottle):
+    kind = 'ip'
+
+    def get_key(self, request):
+        return self.get_ident(request)
+
+
+class EmailThrottle(SlidingWindowThrottle):
+    """Per account, so rotating IPs doesn't help against one victim."""
+    kind = 'email'
+
+    def get_key(self, request):
+        if not isinstance(request.data, Mapping):
+            # e.g. a JSON list; left to the serializer to reject
+            return None
+        email = request.data.get('email')
+        return email.strip().lower() if isinstance(email, str) else None
@@ -1,38 +1,37 @@
-from django.core.mail import EmailMessage
 from django.http import HttpResponse
-from django.conf import settings
-from rest_framework import generics, authentication, permissions, status
+from rest_framework import generics, permissions, status, exceptions
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from core.models import AuthToken, EmailToken, OutgoingEmail
+from .authentication import CachedTokenAuthentication
 from .serializers import *
-import secrets
+from .throttling import EmailThrottle, IPThrottle
 
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
     def perform_create(self, serializer):
         user = serializer.save(is_active=False)  # Create inactive user
-        user.set_email_token()
-        user.save()
-        print(user.email_token)
+        _, key = EmailToken.objects.create_token(user, EmailToken.PURPOSE_ACTIVATION)
         subject = 'Activate your account'
-        message = f'Hi {user.name}, activate your account \n token: {user.email_token}'
-        
-        email = EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
-        email.send()
+        message = f'Hi {user.name}, activate your account \n token: {key}'
+        # Delivered by `manage.py run_mail_worker`
+        OutgoingEmail.objects.enqueue(subject, message, [user.email])
 
 class ActivateUserView(APIView):
     serializer_class = ActivateUserSerializer
+    # No authentication, so Basic auth headers can't trigger password hashing
+    authentication_classes = []
+    throttle_classes = [IPThrottle]
+    throttle_scope = 'email_token'
+
     def post(self, request):
         serializer = ActivateUserSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         token = serializer.validated_data['token']
-        print(token)
-        user = get_user_model().objects.filter(email_token=token).first()
-        if user and user.is_email_token_valid(token):
+        user = EmailToken.objects.consume(token, EmailToken.PURPOSE_ACTIVATION)
+        if user:
             user.is_active = True
-            user.clear_email_token()
             user.save()
             return HttpResponse('Your account has been activated', status=200)
         else:
@@ -40,6 +39,9 @@ class ActivateUserView(APIView):
 
 class ForgotPasswordView(APIView):
     serializer_class = ForgotPasswordSerializer
+    authentication_classes = []
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         serializer = ForgotPasswordSerializer(data=request.data)
@@ -48,30 +50,28 @@ class ForgotPasswordView(APIView):
         user = get_user_model().objects.filter(email=email).first()
         
         if user:
-            user.set_email_token()
-            print(user.email_token)
-            user.save()
+            _, key = EmailToken.objects.create_token(user, EmailToken.PURPOSE_RESET)
             # Send email
             subject = 'Password Reset'
-            message = f'Use the token below to reset password: \n Token: {user.email_token}'
-            email = EmailMessage(subject, message, settings.DEFAULT_FROM_EMAIL, [user.email])
-            email.send()
+            message = f'Use the token below to reset password: \n Token: {key}'
+            OutgoingEmail.objects.enqueue(subject, message, [user.email])
         
         return Response({"message": "we have sent token to your email, \n use it while reseting password."}, status=status.HTTP_200_OK)
 
 class ResetPasswordView(APIView):
     serializer_class = ResetPasswordSerializer
+    authentication_classes = []
+    throttle_classes = [IPThrottle]
+    throttle_scope = 'email_token'
 
     def post(self, request):
         serializer = ResetPasswordSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         token = serializer.validated_data['token']
-        print(token)
-        user = get_user_model().objects.filter(email_token=token).first()
+        user = EmailToken.objects.consume(token, EmailToken.PURPOSE_RESET)
 
-        if user and user.is_email_token_valid(token):
+        if user:
             user.set_password(serializer.validated_data['password'])
-            user.clear_email_token()
             user.save()
             return Response({"message": "Password reset successful."}, status=status.HTTP_200_OK)
         else:
@@ -79,14 +79,44 @@ class ResetPasswordView(APIView):
 
 
 
-class AuthTokenView(ObtainAuthToken):
+class AuthTokenView(generics.GenericAPIView):
+    """
+    POST credentials for a new token, one per device. DELETE with a token
+    to revoke it.
+    """
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    authentication_classes = [CachedTokenAuthentication]
+    # Checked before the serializer hashes the password
+    throttle_classes = [IPThrottle, EmailThrottle]
+    throttle_scope = 'login'
+
+    def get_authenticators(self):
+        # A client whose token has expired or been revoked still sends it,
+        # and must not get a 401 from the endpoint that issues a new one
+        if self.request.method == 'POST':
+            return []
+        return super().get_authenticators()
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        token, key = AuthToken.objects.create_token(
+            serializer.validated_data['user'],
+            name=serializer.validated_data.get('name', ''),
+        )
+        return Response({'token': key, 'expires_at': token.expires_at})
+
+    def delete(self, request):
+        if not isinstance(request.auth, AuthToken):
+            raise exceptions.NotAuthenticated()
+        request.auth.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):